@@ -7,17 +7,25 @@ from flask_user import login_required, allow_unconfirmed_email
 
 import dash_bootstrap_components as dbc
 
-from config import DB_PATH
+from archive import init_archive_schedule
+from booking_versions import init_booking_versions
+from config import DATABASE_URL, engine_options
+from metrics import init_metrics
 from models import User, db, init_db
+from occupancy_events import init_occupancy_events
 from plugins.admin import init_flask_admin
+from plugins.commands import init_commands
 from plugins.user import CustomUserManager
+from slot_occupancy import init_slot_occupancy
+from sqlite_profile import init_sqlite_profile
 
 fapp = Flask(__name__)
 
 fapp.secret_key = os.getenv('SECRET_KEY', 'This is an INSECURE secret!! DO NOT use this in production!!')
 
 
-fapp.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///" + DB_PATH
+fapp.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+fapp.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options()
 fapp.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 fapp.config['MAIL_SERVER'] = os.getenv("SMTP_SERVER")
 fapp.config['MAIL_PORT'] = int(os.getenv("PORT", 587))
@@ -48,10 +56,17 @@ app = Dash(
     suppress_callback_exceptions=True,
 )
 
+init_sqlite_profile()
+init_metrics(fapp, app)
 init_flask_admin(fapp)
+init_commands(fapp)
 user_manager = CustomUserManager(fapp, db, UserClass=User)
 migrate = Migrate(fapp, db)
 init_db(fapp, user_manager)
+init_slot_occupancy()
+init_booking_versions()
+init_occupancy_events(fapp)
+init_archive_schedule(fapp)
 
 
 for view_func in fapp.view_functions:
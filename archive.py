@@ -0,0 +1,109 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, union_all
+
+import config
+from models import db, Booking, BookingArchive
+from slot_occupancy import apply_delta
+from time_utils import start_of_day
+
+ARCHIVED_COLUMNS = ["id", "number", "start", "end", "note", "user_id", "zone_id"]
+
+
+def archive_cutoff(days=None):
+    return start_of_day(datetime.now() - timedelta(days=config.ARCHIVE_AFTER_DAYS if days is None else days))
+
+
+def archive_bookings(days=None, chunk_size=None, max_chunks=None):
+    """
+    Move bookings which ended more than `days` days ago into bookings_archive.
+
+    Bookings are moved in chunks of `chunk_size`, each in its own transaction, so the bookings table is never
+    locked for long. Returns the number of archived bookings.
+    """
+    from booking_logic import occupancy_cache
+
+    cutoff = archive_cutoff(days)
+    chunk_size = chunk_size or config.ARCHIVE_CHUNK_SIZE
+    bookings = Booking.__table__
+    archived = 0
+    chunks = 0
+
+    while max_chunks is None or chunks < max_chunks:
+        rows = db.session.query(Booking.id, Booking.zone_id, Booking.start, Booking.end, Booking.number)\
+            .filter(Booking.end <= cutoff)\
+            .order_by(Booking.id)\
+            .limit(chunk_size)\
+            .all()
+        if not rows:
+            break
+
+        ids = [x.id for x in rows]
+        connection = db.session.connection()
+        connection.execute(BookingArchive.__table__.insert().from_select(
+            ARCHIVED_COLUMNS,
+            select(*[bookings.c[x] for x in ARCHIVED_COLUMNS]).where(bookings.c.id.in_(ids))
+        ))
+        deleted = connection.execute(bookings.delete().where(bookings.c.id.in_(ids))).rowcount
+        if deleted != len(ids):
+            # Another worker archived some of these rows since they were read
+            db.session.rollback()
+            break
+
+        # Rows are moved with plain SQL, so the slot occupancy has to be updated here
+        for x in rows:
+            apply_delta(connection, x.zone_id, x.start, x.end, -(x.number or 1))
+
+        db.session.commit()
+        occupancy_cache.invalidate(*{x.zone_id for x in rows})
+
+        archived += len(rows)
+        chunks += 1
+
+    return archived
+
+
+def booking_history(user_id):
+    """All bookings of user_id, both current and archived, as one selectable with the bookings columns."""
+    tables = [Booking.__table__, BookingArchive.__table__]
+    return union_all(*[
+        select(*[t.c[x] for x in ARCHIVED_COLUMNS]).where(t.c.user_id == user_id) for t in tables
+    ]).subquery()
+
+
+def _archive_periodically(fapp):
+    with fapp.app_context():
+        while True:
+            time.sleep(config.ARCHIVE_INTERVAL)
+            try:
+                archive_bookings(max_chunks=1)
+            except Exception:
+                db.session.rollback()
+                import traceback
+                traceback.print_exc()
+            finally:
+                db.session.remove()
+
+
+def init_archive_schedule(fapp):
+    """
+    Archive one chunk of old bookings every ARCHIVE_INTERVAL seconds from a thread, outside of any request.
+
+    With ARCHIVE_INTERVAL=0 nothing is scheduled, run `flask bookings archive` from cron instead.
+    """
+    if config.ARCHIVE_INTERVAL <= 0:
+        return
+
+    thread = []
+    lock = threading.Lock()
+
+    @fapp.before_request
+    def start_archive_thread():
+        # Started from a request, so every forked worker gets its own thread
+        if not thread:
+            with lock:
+                if not thread:
+                    thread.append(threading.Thread(target=_archive_periodically, args=(fapp,), daemon=True))
+                    thread[0].start()
@@ -1,32 +1,149 @@
 
 
-function set_fig(data, view_data) {
+// Values painted over the occupancy for the cell states of heatmap_payload.py
+const STATE_VALUES = [null, -3, -3.5, -4.5]
+const STATE_SELECTED = 2
+const STATE_CLOSED = 3
 
-    if(view_data.zone === null) {
-        return [
-            {
-                "layout": {
-                    "xaxis": {
-                        "visible": false
-                    },
-                    "yaxis": {
-                        "visible": false
-                    },
-                    "annotations": [
-                        {
-                            "text": "",
-                            "xref": "paper",
-                            "yref": "paper",
-                            "showarrow": false,
-                            "font": {
-                                "size": 28
-                            }
-                        }
-                    ]
-                }
-            }
-        ]
+let slot_labels = {}
+
+function get_slot_labels(slots, slot_minutes) {
+    let key = slots + "/" + slot_minutes
+    if(!(key in slot_labels)) {
+        let labels = []
+        for (let k = slots - 1; k >= 0; k--) {
+            let minutes = k * slot_minutes
+            labels.push(String(Math.floor(minutes / 60)).padStart(2, "0") + ":" + String(minutes % 60).padStart(2, "0"))
+        }
+        slot_labels[key] = labels
+    }
+    return slot_labels[key]
+}
+
+function decode_base64(s) {
+    let binary = atob(s)
+    let bytes = new Uint8Array(binary.length)
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i)
     }
+    return bytes
+}
+
+function slot_index(t, start, slot_minutes) {
+    let days = (Date.parse(t.slice(0, 10) + "T00:00:00Z") - Date.parse(start + "T00:00:00Z")) / 86400000
+    let minutes = parseInt(t.slice(11, 13)) * 60 + parseInt(t.slice(14, 16))
+    return days * 24 * 60 / slot_minutes + Math.floor(minutes / slot_minutes)
+}
+
+// The selection is painted here, so selecting does not reload the occupancy from the server
+function paint_selection(states, selection, data) {
+    if(!selection || !selection.f) {
+        return
+    }
+    let first = slot_index(selection.f, data.start, data.slot_minutes)
+    if(first < 0 || first >= states.length) {
+        return
+    }
+    let end = selection.t ? Math.min(slot_index(selection.t, data.start, data.slot_minutes), states.length) : first + 1
+    for (let i = first; i < Math.max(end, first + 1); i++) {
+        if(states[i] !== STATE_CLOSED) {
+            states[i] = STATE_SELECTED
+        }
+    }
+}
+
+function decode_occupancy(data) {
+    let bytes = decode_base64(data.occupancy)
+    let occupancy
+    if(data.encoding === "delta") {
+        occupancy = new Int32Array(bytes.length)
+        let deltas = new Int8Array(bytes.buffer)
+        for (let i = 0, sum = 0; i < deltas.length; i++) {
+            sum += deltas[i]
+            occupancy[i] = sum
+        }
+    } else {
+        let view = new DataView(bytes.buffer)
+        occupancy = new Int32Array(bytes.length / 2)
+        for (let i = 0; i < occupancy.length; i++) {
+            occupancy[i] = view.getInt16(2 * i, true)
+        }
+    }
+    return occupancy
+}
+
+function decode_heatmap(data, selection, occupancy) {
+    let slots = 24 * 60 / data.slot_minutes
+    let states = new Uint8Array(slots * data.days)
+    for (const [first, length, state] of data.states) {
+        states.fill(state, first, first + length)
+    }
+    paint_selection(states, selection, data)
+
+    let x = []
+    let start = Date.parse(data.start + "T00:00:00Z")
+    for (let j = 0; j < data.days; j++) {
+        x.push(new Date(start + j * 86400000).toISOString().slice(0, 10))
+    }
+
+    // Rows are slots from the end of the day, columns are days
+    let z = []
+    let hover = []
+    for (let i = 0; i < slots; i++) {
+        let z_row = []
+        let hover_row = []
+        for (let j = 0; j < data.days; j++) {
+            let idx = j * slots + slots - 1 - i
+            let value = occupancy[idx]
+            hover_row.push(value)
+            z_row.push(states[idx] ? STATE_VALUES[states[idx]] : value)
+        }
+        z.push(z_row)
+        hover.push(hover_row)
+    }
+
+    return {x: x, y: get_slot_labels(slots, data.slot_minutes), z: z, hover: hover, max: data.max, close: data.close}
+}
+
+function prefetch_key(zone, d) {
+    return zone + "|" + d.slice(0, 10)
+}
+
+// Heatmap data of the view, from the data store or else from the prefetched maps
+function view_heatmap(data, prefetch, zone, d) {
+    let matches = x => x && x.occupancy && x.zone === zone && x.start === d.slice(0, 10)
+    if(matches(data)) {
+        return data
+    }
+    let prefetched = prefetch && prefetch[prefetch_key(zone, d)]
+    return matches(prefetched) ? prefetched : null
+}
+
+function heatmap_key(selection, view_data, current, prefetch) {
+    let key = {zone: view_data.zone, d: selection.d, booked: selection.booked || 0}
+    if(current && key.zone === current.zone && key.d === current.d && key.booked === current.booked) {
+        throw window.dash_clientside.PreventUpdate
+    }
+    // The server only sends the map again when it has changed since this version was prefetched
+    let prefetched = prefetch && key.zone !== null && prefetch[prefetch_key(key.zone, key.d)]
+    if(prefetched && prefetched.changes !== null) {
+        key.version = prefetched.changes
+    }
+    return [key]
+}
+
+// The heatmap shown right now, patched in place by pushed occupancy changes
+let live = null
+let events = null
+// Asks for the stream again while the server refuses it, backing off from RETRY_MIN_MS, see subscribe
+let retry = null
+const RETRY_MIN_MS = 15000
+const RETRY_MAX_MS = 240000
+let retry_ms = RETRY_MIN_MS
+
+function build_figure(live) {
+    let view_data = live.view_data
+    let data = decode_heatmap(live.data, live.selection, live.occupancy)
 
     let y_range;
     switch(view_data.show) {
@@ -133,11 +250,161 @@ function set_fig(data, view_data) {
              }
          }
     }
-    return [k]
+    return k
+}
+
+function redraw_live() {
+    let gd = document.querySelector("#main-graph .js-plotly-plot")
+    if(gd && window.Plotly) {
+        let k = build_figure(live)
+        window.Plotly.react(gd, k.data, k.layout)
+    }
+}
+
+function refresh_heatmap() {
+    let refresh = document.getElementById("heatmap-refresh")
+    if(refresh) {
+        refresh.click()
+    }
+}
+
+function on_occupancy_event(e) {
+    // Overflow reloads carry no id
+    if(!live || e.zone !== live.view_data.zone || (e.id !== null && e.id <= live.changes)) {
+        return
+    }
+    if(e.id !== null) {
+        live.changes = e.id
+    }
+    if(e.reload) {
+        refresh_heatmap()
+        return
+    }
+    let data = live.data
+    let day = (Date.parse(e.day + "T00:00:00Z") - Date.parse(data.start + "T00:00:00Z")) / 86400000
+    if(day < 0 || day >= data.days) {
+        return
+    }
+    let slots = 24 * 60 / data.slot_minutes
+    for (let s = e.first; s < e.last; s++) {
+        live.occupancy[day * slots + s] += e.delta
+    }
+    redraw_live()
+}
+
+function subscribe(zone, changes) {
+    if(typeof EventSource === "undefined") {
+        return
+    }
+    // Closed sources were refused by the server, for instance when it has too many clients
+    if(events && events.zone === zone && events.source.readyState !== EventSource.CLOSED) {
+        return
+    }
+    if(events) {
+        events.source.close()
+    }
+    let url = "/occupancy/events/" + zone + (changes !== null && changes !== undefined ? "?after=" + changes : "")
+    let source = new EventSource(url)
+    source.onmessage = function(message) {
+        on_occupancy_event(JSON.parse(message.data))
+    }
+    source.onopen = function() {
+        retry_ms = RETRY_MIN_MS
+    }
+    source.onerror = function() {
+        // Refused, for instance with a 503 when the worker has no stream slot left. Browsers do not retry those,
+        // so it is asked for again later. The changes missed meanwhile are replayed once it is accepted.
+        if(source.readyState === EventSource.CLOSED && retry === null) {
+            retry = setTimeout(function() {
+                retry = null
+                if(live) {
+                    subscribe(live.view_data.zone, live.changes)
+                }
+            }, retry_ms)
+            retry_ms = Math.min(retry_ms * 2, RETRY_MAX_MS)
+        }
+    }
+    events = {zone: zone, source: source}
+}
+
+function set_fig(data, selection, view_data, prefetch) {
+
+    if(view_data.zone === null || !data || !data.occupancy) {
+        return [
+            {
+                "layout": {
+                    "xaxis": {
+                        "visible": false
+                    },
+                    "yaxis": {
+                        "visible": false
+                    },
+                    "annotations": [
+                        {
+                            "text": "",
+                            "xref": "paper",
+                            "yref": "paper",
+                            "showarrow": false,
+                            "font": {
+                                "size": 28
+                            }
+                        }
+                    ]
+                }
+            },
+            window.dash_clientside.no_update
+        ]
+    }
+
+    data = view_heatmap(data, prefetch, view_data.zone, selection.d)
+    if(!data) {
+        // Still loading, the spinner is shown until the figure changes
+        return [window.dash_clientside.no_update, window.dash_clientside.no_update]
+    }
+
+    if(!live || live.data !== data) {
+        live = {data: data, occupancy: decode_occupancy(data), changes: data.changes === null ? Infinity : data.changes}
+    }
+    live.selection = selection
+    live.view_data = view_data
+    if(data.changes !== null) {
+        subscribe(view_data.zone, data.changes)
+    }
+
+    let rendered = {zone: data.zone, d: selection.d}
+    let rendered_changed = !live.rendered || live.rendered.zone !== rendered.zone || live.rendered.d !== rendered.d
+    live.rendered = rendered
+
+    return [build_figure(live), rendered_changed ? rendered : window.dash_clientside.no_update]
+}
+
+function update_zone_picker(next_clicks, prev_clicks, options, value) {
+    let triggered = window.dash_clientside.callback_context.triggered
+    let values = options.map(x => x.value)
+    let idx = values.indexOf(value)
+    if(triggered.length === 1 && triggered[0].value) {
+        if(triggered[0].prop_id === "next-zone.n_clicks" && idx < values.length - 1) {
+            return values[idx + 1]
+        }
+        if(triggered[0].prop_id === "prev-zone.n_clicks" && idx > 0) {
+            return values[idx - 1]
+        }
+    }
+    throw window.dash_clientside.PreventUpdate
+}
+
+function toggle_spinner(...args) {
+    let view_data = args[args.length - 1]
+    let triggered = window.dash_clientside.callback_context.triggered
+    let drawn = triggered.some(x => x.prop_id === "main-graph.figure")
+    return [drawn && view_data.zone !== null]
 }
 
 window.dash_clientside = Object.assign({}, window.dash_clientside, {
     clientside: {
-        set_fig: set_fig
+        set_fig: set_fig,
+        heatmap_key: heatmap_key,
+        update_zone_picker: update_zone_picker,
+        toggle_spinner: toggle_spinner
     }
 });
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Cost of ordinary member requests as a gym grows from 100 to 50,000 members.
+
+The gym gets more members between the measurements. Every request is sent through the Flask test client as one
+of its members, who is neither admin nor instructor, so is_admin() and is_instructor() have to be answered.
+
+    python benchmarks/bench_membership.py
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES = [100, 1000, 10000, 50000]
+REPEAT = 30
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "membership.sqlite")
+    os.environ["ARCHIVE_INTERVAL"] = "0"
+    os.chdir(ROOT)
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    import index  # noqa: F401, registers the callbacks
+    from app import fapp
+    from models import db, Gym, User, gym_admins, gym_instructors, gym_memberships
+
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    event.listen(Engine, "after_cursor_execute", count)
+
+    with fapp.app_context():
+        gym = Gym.query.first()
+        gym_id, zone_id = gym.id, gym.zones[0].id
+        member = User(active=True, username="member", email="member@example.com", password="", gyms=[gym],
+                      email_confirmed_at=datetime.now())
+        db.session.add(member)
+        db.session.commit()
+        token = member.get_id()
+        next_user = db.session.query(db.func.max(User.id)).scalar() + 1
+
+    fapp.config["PROPAGATE_EXCEPTIONS"] = True
+    client = fapp.test_client()
+    with client.session_transaction() as s:
+        s["_user_id"] = token
+        s["_fresh"] = True
+
+    week_request = {
+        "output": "..week.children...next_week.disabled...prev_week.disabled..",
+        "outputs": [{"id": "week", "property": "children"}, {"id": "next_week", "property": "disabled"},
+                    {"id": "prev_week", "property": "disabled"}],
+        "inputs": [{"id": "selection_store", "property": "data", "value": {"d": datetime.now().isoformat(timespec="seconds")}},
+                   {"id": "view_store", "property": "data", "value": {"zone": zone_id}},
+                   {"id": "location", "property": "pathname", "value": "/"}],
+        "state": [],
+        "changedPropIds": ["selection_store.data"],
+    }
+    layout_request = {
+        "output": "..layout.children...navbar.children...navbar.brand..",
+        "outputs": [{"id": "layout", "property": "children"}, {"id": "navbar", "property": "children"},
+                    {"id": "navbar", "property": "brand"}],
+        "inputs": [{"id": "location", "property": "pathname", "value": "/"}],
+        "state": [],
+        "changedPropIds": ["location.pathname"],
+    }
+
+    print(f"{'members':>8} {'request':<8} {'p50 ms':>8} {'p95 ms':>8} {'sql':>5}")
+    members = 2
+    for size in SIZES:
+        with fapp.app_context():
+            now = datetime.now()
+            new = list(range(next_user, next_user + size - members))
+            db.session.execute(User.__table__.insert(), [
+                dict(id=x, active=True, username=f"m{x}", email=f"m{x}@example.com", password="", role="USER",
+                     email_confirmed_at=now) for x in new
+            ])
+            db.session.execute(gym_memberships.insert(), [dict(user=x, gym=gym_id) for x in new])
+            # A big club has a few staff members as well
+            for table, staff in [(gym_admins, new[:size // 1000]), (gym_instructors, new[:size // 100])]:
+                if staff:
+                    db.session.execute(table.insert(), [dict(user=x, gym=gym_id) for x in staff])
+            db.session.commit()
+            next_user += len(new)
+            members = size
+
+        for name, body in [("week", week_request), ("layout", layout_request)]:
+            seconds, counts = [], []
+            for _ in range(REPEAT):
+                statements[0] = 0
+                t0 = time.perf_counter()
+                response = client.post("/_dash-update-component", json=body)
+                assert response.status_code == 200, response.data[:500]
+                seconds.append(time.perf_counter() - t0)
+                counts.append(statements[0])
+            print(f"{size:>8} {name:<8} {percentile(seconds, 50) * 1000:>8.2f} {percentile(seconds, 95) * 1000:>8.2f} "
+                  f"{max(counts):>5}")
+
+
+if __name__ == '__main__':
+    main()
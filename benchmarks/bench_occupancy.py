@@ -0,0 +1,57 @@
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from occupancy import booking_occupancy, repeating_occupancy, SLOTS_PER_DAY, SLOT_MINUTES, REPEAT_PERIODS  # noqa: E402
+
+DAYS = 7
+WEEK_START = datetime(2021, 5, 17)
+
+
+def random_bookings(n, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        start = WEEK_START + timedelta(minutes=SLOT_MINUTES * rnd.randrange(SLOTS_PER_DAY * DAYS - 8))
+        rows.append((start, start + timedelta(minutes=SLOT_MINUTES * rnd.randint(1, 8)), rnd.randint(1, 4)))
+    return rows
+
+
+def random_repeating_bookings(n, seed=0):
+    rnd = random.Random(seed)
+    kinds = list(REPEAT_PERIODS) + ["m"]
+    rows = []
+    for _ in range(n):
+        start = WEEK_START - timedelta(days=rnd.randrange(365), minutes=SLOT_MINUTES * rnd.randrange(80))
+        rows.append((start, start + timedelta(minutes=SLOT_MINUTES * rnd.randint(1, 8)), rnd.randint(1, 4),
+                     rnd.choice(kinds), None))
+    return rows
+
+
+def best_of(f, repeat):
+    return min(timeit.repeat(f, number=repeat, repeat=5)) / repeat
+
+
+def main():
+    print("One-off bookings in a week")
+    print(f"{'bookings':>10} {'total ms':>10} {'us/booking':>12}")
+    for n in [100, 1000, 10000, 100000]:
+        rows = random_bookings(n)
+        total = best_of(lambda: booking_occupancy(rows, WEEK_START, DAYS), max(3, 10000 // n))
+        print(f"{n:>10} {total * 1000:>10.3f} {total / n * 1e6:>12.3f}")
+
+    print("Repeating bookings")
+    print(f"{'bookings':>10} {'days':>6} {'total ms':>10}")
+    for n in [100, 1000]:
+        rows = random_repeating_bookings(n)
+        for days in [7, 90, 365]:
+            total = best_of(lambda: repeating_occupancy(rows, WEEK_START, days), 10)
+            print(f"{n:>10} {days:>6} {total * 1000:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
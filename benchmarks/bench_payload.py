@@ -0,0 +1,79 @@
+"""
+Size and serialization time of the data-store payload, as JSON lists and in the compact encoding.
+
+    python benchmarks/bench_payload.py
+"""
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from heatmap_payload import encode_heatmap, decode_heatmap, MINE, SELECTED, CLOSED  # noqa: E402
+from occupancy import SLOTS_PER_DAY, booking_occupancy  # noqa: E402
+
+DAYS = 7
+WEEK_START = datetime(2021, 5, 17)
+
+
+def week(max_people, seed=0):
+    """A busy week, with about max_people persons at a time in the afternoons."""
+    rnd = np.random.default_rng(seed)
+    rows = []
+    for _ in range(max_people * DAYS * 2):
+        start = WEEK_START + timedelta(days=int(rnd.integers(DAYS)), hours=float(rnd.normal(17, 3)))
+        start = min(max(start, WEEK_START), WEEK_START + timedelta(days=DAYS, hours=-4)).replace(second=0, microsecond=0)
+        rows.append((start, start + timedelta(minutes=15 * int(rnd.integers(4, 13))), 1))
+    occupancy = booking_occupancy(rows, WEEK_START, DAYS)
+    states = np.zeros(len(occupancy), dtype=np.uint8)
+    states[:SLOTS_PER_DAY * 2 + 40] = CLOSED
+    states[rnd.integers(0, len(states), 20)] = MINE
+    states[400:408] = SELECTED
+    return occupancy, states
+
+
+def json_lists(occupancy, states, max_people):
+    """The payload as it was before the compact encoding."""
+    z = occupancy.copy()
+    z[states == MINE] = -3
+    z[states == SELECTED] = -3.5
+    z[states == CLOSED] = -4.5
+    x = [(WEEK_START.date() + timedelta(days=x)) for x in range(DAYS)]
+    y = list(reversed([(datetime(1, 1, 1) + timedelta(minutes=15 * k)).strftime("%H:%M") for k in range(SLOTS_PER_DAY)]))
+    z = np.flipud(np.reshape(z, (DAYS, SLOTS_PER_DAY)).transpose())
+    hover = np.flipud(np.reshape(occupancy, (DAYS, SLOTS_PER_DAY)).transpose())
+    return {"x": x, "y": y, "z": z, "max": max_people, "close": 2, "hover": hover}
+
+
+def serialize(payload):
+    return json.dumps(payload, cls=PlotlyJSONEncoder)
+
+
+def best_of(f, repeat=200):
+    return min(timeit.repeat(f, number=repeat, repeat=5)) / repeat
+
+
+def main():
+    print(f"{'capacity':>8} {'json bytes':>11} {'compact bytes':>14} {'ratio':>6} {'json ms':>8} {'compact ms':>11}")
+    for max_people in (10, 50, 500):
+        occupancy, states = week(max_people)
+
+        decoded_occupancy, decoded_states = decode_heatmap(encode_heatmap(1, WEEK_START, occupancy, states, max_people, 2))
+        assert (decoded_occupancy == occupancy).all() and (decoded_states == states).all()
+
+        old = serialize(json_lists(occupancy, states, max_people))
+        new = serialize(encode_heatmap(1, WEEK_START, occupancy, states, max_people, 2))
+        t_old = best_of(lambda: serialize(json_lists(occupancy, states, max_people)))
+        t_new = best_of(lambda: serialize(encode_heatmap(1, WEEK_START, occupancy, states, max_people, 2)))
+
+        print(f"{max_people:>8} {len(old):>11} {len(new):>14} {len(old) / len(new):>6.1f} "
+              f"{t_old * 1000:>8.3f} {t_new * 1000:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
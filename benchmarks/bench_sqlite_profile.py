@@ -0,0 +1,168 @@
+"""
+Concurrent readers and writers against a SQLite database, with and without the SQLite performance profile.
+
+Readers load the weekly occupancy of a zone like the heatmap does, writers insert and delete bookings through the
+ORM so the slot occupancy hooks run as in production.
+
+    python benchmarks/bench_sqlite_profile.py --readers 6 --writers 2 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ZONES = 4
+
+
+def configure(db_path, profile):
+    os.environ["DB_PATH"] = db_path
+    os.environ["SQLITE_PROFILE"] = "1" if profile else "0"
+    os.environ["ARCHIVE_INTERVAL"] = "0"
+    os.chdir(ROOT)
+
+
+def setup(db_path, profile, bookings, results):
+    configure(db_path, profile)
+    from app import fapp
+    from models import db, Booking, Gym, Zone
+    from slot_occupancy import rebuild
+    from sqlite_profile import current_pragmas
+
+    with fapp.app_context():
+        gym = Gym.query.first()
+        db.session.add_all([Zone(name=f"bench{i}", gym=gym) for i in range(ZONES - len(gym.zones))])
+        db.session.commit()
+        zone_ids = [x.id for x in gym.zones]
+
+        rnd = random.Random(0)
+        now = datetime.now().replace(minute=0, second=0, microsecond=0)
+        rows = []
+        for _ in range(bookings):
+            start = now + timedelta(minutes=15 * rnd.randrange(-96 * 60, 96 * 14))
+            rows.append(dict(zone_id=rnd.choice(zone_ids), user_id=1, number=1,
+                             start=start, end=start + timedelta(minutes=15 * rnd.randint(1, 8))))
+        db.session.execute(Booking.__table__.insert(), rows)
+        db.session.commit()
+        rebuild()
+        results.put((zone_ids, current_pragmas(db.session.connection())))
+
+
+def reader(db_path, profile, zone_ids, ready, seconds, results):
+    configure(db_path, profile)
+    from app import fapp
+    from booking_logic import create_zone_occupancy, user_active_bookings
+    from time_utils import start_of_week
+
+    rnd = random.Random(os.getpid())
+    week = start_of_week(datetime.now())
+    latencies, errors = [], 0
+    ready.wait()
+    until = time.time() + seconds
+    with fapp.app_context():
+        while time.time() < until:
+            t0 = time.perf_counter()
+            try:
+                create_zone_occupancy(week, 7, rnd.choice(zone_ids))
+                user_active_bookings(1, datetime.now()).count()
+                latencies.append(time.perf_counter() - t0)
+            except Exception:
+                errors += 1
+            finally:
+                from models import db
+                db.session.remove()
+    results.put(("read", latencies, errors))
+
+
+def writer(db_path, profile, zone_ids, ready, seconds, results):
+    configure(db_path, profile)
+    from sqlalchemy.exc import OperationalError
+
+    from app import fapp
+    from models import db, Booking
+
+    rnd = random.Random(os.getpid())
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    latencies, errors = [], 0
+    ready.wait()
+    until = time.time() + seconds
+    with fapp.app_context():
+        while time.time() < until:
+            t0 = time.perf_counter()
+            try:
+                start = now + timedelta(minutes=15 * rnd.randrange(96 * 7))
+                booking = Booking(zone_id=rnd.choice(zone_ids), user_id=1, number=1,
+                                  start=start, end=start + timedelta(hours=1))
+                db.session.add(booking)
+                db.session.commit()
+                db.session.delete(booking)
+                db.session.commit()
+                latencies.append(time.perf_counter() - t0)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+            finally:
+                db.session.remove()
+    results.put(("write", latencies, errors))
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(profile, args):
+    ctx = multiprocessing.get_context("spawn")
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+    results = ctx.Queue()
+
+    p = ctx.Process(target=setup, args=(db_path, profile, args.bookings, results))
+    p.start()
+    zone_ids, pragmas = results.get()
+    p.join()
+
+    # Every process imports the app first and then starts at the same time
+    ready = ctx.Barrier(args.readers + args.writers)
+    processes = [ctx.Process(target=reader, args=(db_path, profile, zone_ids, ready, args.seconds, results))
+                 for _ in range(args.readers)]
+    processes += [ctx.Process(target=writer, args=(db_path, profile, zone_ids, ready, args.seconds, results))
+                  for _ in range(args.writers)]
+    for p in processes:
+        p.start()
+    totals = {"read": ([], 0), "write": ([], 0)}
+    for _ in processes:
+        kind, latencies, errors = results.get()
+        totals[kind] = (totals[kind][0] + latencies, totals[kind][1] + errors)
+    for p in processes:
+        p.join()
+
+    print(f"profile {'on' if profile else 'off'}: {pragmas}")
+    for kind, (latencies, errors) in totals.items():
+        print(f"  {kind:<6} {len(latencies) / args.seconds:8.0f} ops/s   "
+              f"p50 {percentile(latencies, 50) * 1000:7.2f} ms   "
+              f"p99 {percentile(latencies, 99) * 1000:7.2f} ms   "
+              f"errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=6)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--bookings", type=int, default=20000)
+    args = parser.parse_args()
+
+    for profile in (False, True):
+        run(profile, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Time the booking hot paths on synthetic databases of several sizes, see benchmarks/synthetic.py.
+
+Every call runs in its own request context, logged in as a member of the first synthetic gym, or as its admin for
+the admin operations. The occupancy cache is cleared before every call, so the timings are for cold maps. Results
+are written as JSON, with the SQL statement count of every call, so runs can be compared.
+
+    python benchmarks/bench_suite.py --scales small medium --output before.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Timer:
+    """Times calls in fresh request contexts and counts their SQL statements."""
+
+    def __init__(self, fapp, repeat):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        self.fapp = fapp
+        self.repeat = repeat
+        self.statements = 0
+        event.listen(Engine, "after_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.statements += 1
+
+    def time(self, user_id, run, setup=None, teardown=None, repeat=None):
+        from flask_login import login_user
+
+        from booking_logic import occupancy_cache
+        from models import User
+
+        seconds, statements = [], []
+        for _ in range(repeat or self.repeat):
+            with self.fapp.test_request_context():
+                login_user(User.query.get(user_id))
+                args = setup() if setup else ()
+                occupancy_cache.clear()
+
+                self.statements = 0
+                t0 = time.perf_counter()
+                run(*args)
+                seconds.append(time.perf_counter() - t0)
+                statements.append(self.statements)
+
+                if teardown:
+                    teardown(*args)
+        return {
+            "n": len(seconds),
+            "min_ms": min(seconds) * 1000,
+            "mean_ms": sum(seconds) / len(seconds) * 1000,
+            "p50_ms": percentile(seconds, 50) * 1000,
+            "p95_ms": percentile(seconds, 95) * 1000,
+            "sql_statements": max(statements),
+        }
+
+
+def run_scale(scale, seed, repeat, admin_repeat, results):
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), f"{scale}.sqlite")
+    os.environ["ARCHIVE_INTERVAL"] = "0"
+    os.chdir(ROOT)
+
+    from app import fapp
+    from booking_logic import create_daily_booking_map, create_weekly_booking_map, validate_booking
+    from models import db, Booking, Gym, GymBooking, gym_admins
+    from pages.bookings_list import create_bookings
+    from pages.gym_page import move_bookings, prune_bookings
+    from pages.main_page import create_heatmap
+    from benchmarks.synthetic import SCALES, generate
+    from time_utils import start_of_week
+
+    with fapp.app_context():
+        t0 = time.perf_counter()
+        rows = generate(seed=seed, **SCALES[scale])
+        generate_seconds = time.perf_counter() - t0
+
+        gym = Gym.query.filter(Gym.code.like("synthetic%")).order_by(Gym.id).first()
+        zone_id, other_zone_id = gym.zones[0].id, gym.zones[1].id
+        admin_id = db.session.query(gym_admins.c.user).filter(gym_admins.c.gym == gym.id).scalar()
+        member_id = db.session.query(Booking.user_id)\
+            .filter(Booking.zone_id.in_([x.id for x in gym.zones]), Booking.user_id != admin_id)\
+            .group_by(Booking.user_id).order_by(db.func.count().desc()).limit(1).scalar()
+        db.session.remove()
+
+    now = datetime.now()
+    week = start_of_week(now)
+    tomorrow = datetime(now.year, now.month, now.day) + timedelta(days=1, hours=10)
+    timer = Timer(fapp, repeat)
+
+    def validate():
+        try:
+            validate_booking(tomorrow, tomorrow + timedelta(hours=1), 1, zone_id, cached=False)
+        except AssertionError:
+            pass
+
+    def future_bookings():
+        return [
+            {c: getattr(b, c) for c in ["start", "end", "number", "user_id", "zone_id", "note"]}
+            for b in Booking.query.filter(Booking.zone_id == zone_id, Booking.start >= now)
+        ]
+
+    def zone_booking_ids():
+        return [x for x, in db.session.query(Booking.id).filter(Booking.zone_id == zone_id)]
+
+    def move_back(ids):
+        for i in range(0, len(ids), 500):
+            for b in Booking.query.filter(Booking.id.in_(ids[i:i + 500])):
+                b.zone_id = zone_id
+        db.session.commit()
+
+    def restore(rows):
+        db.session.add_all([Booking(**x) for x in rows])
+        db.session.commit()
+
+    benchmarks = {
+        "create_weekly_booking_map": (member_id, lambda: create_weekly_booking_map(week, zone_id), {}),
+        "create_daily_booking_map": (member_id, lambda: create_daily_booking_map(now, zone_id), {}),
+        "validate_booking": (member_id, validate, {}),
+        "create_heatmap": (member_id, lambda: create_heatmap(week, zone_id), {}),
+        "create_bookings": (member_id, lambda: create_bookings(Booking.query.filter_by(user_id=member_id).all()), {}),
+        "create_bookings[gym_bookings]": (
+            admin_id, lambda: create_bookings(GymBooking.query.filter_by(zone_id=zone_id).all()), {}),
+        "move_bookings": (admin_id, lambda ids: move_bookings(zone_id, other_zone_id),
+                          dict(setup=lambda: (zone_booking_ids(),), teardown=move_back, repeat=admin_repeat)),
+        "prune_bookings": (admin_id, lambda rows: prune_bookings(now, [zone_id]),
+                           dict(setup=lambda: (future_bookings(),), teardown=restore, repeat=admin_repeat)),
+    }
+
+    for name, (user_id, run, options) in benchmarks.items():
+        result = timer.time(user_id, run, **options)
+        results.put(dict(scale=scale, benchmark=name, **result))
+    results.put(dict(scale=scale, rows=rows, generate_seconds=generate_seconds))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=["small", "medium", "large"])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--admin-repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to write, stdout when left out")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    report = {
+        "revision": git_revision(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "seed": args.seed,
+        "scales": {},
+        "results": [],
+    }
+
+    for scale in args.scales:
+        # The database is configured on import, so every scale gets a process of its own
+        results = ctx.Queue()
+        p = ctx.Process(target=run_scale, args=(scale, args.seed, args.repeat, args.admin_repeat, results))
+        p.start()
+        while True:
+            result = results.get()
+            if "rows" in result:
+                report["scales"][scale] = {"rows": result["rows"], "generate_seconds": result["generate_seconds"]}
+                break
+            report["results"].append(result)
+            print(f"{scale:<8} {result['benchmark']:<32} p50 {result['p50_ms']:9.2f} ms   "
+                  f"p95 {result['p95_ms']:9.2f} ms   sql {result['sql_statements']:>6}", file=sys.stderr)
+        p.join()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Run the checks against a new SQLite database, and against a throwaway PostgreSQL database when one is reachable.
+
+Every check runs with DATABASE_URL pointing at the database under test: the SQL statement counts, the zone deletion,
+`flask bookings check-indexes` and `flask bookings check-occupancy`, the last one over the bookings the others left.
+The PostgreSQL database is emptied first, so CHECK_POSTGRES_URL must name one that holds nothing else. It defaults to
+postgresql://localhost/booking_check. Exits with status 1 when any check fails.
+
+    CHECK_POSTGRES_URL=postgresql://booking@localhost/booking_check python benchmarks/check_databases.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHECKS = [
+    ("sql counts", [sys.executable, "benchmarks/check_sql_counts.py"]),
+    ("zone delete", [sys.executable, "benchmarks/check_zone_delete.py"]),
+    ("indexes", [sys.executable, "-m", "flask", "bookings", "check-indexes"]),
+    ("occupancy", [sys.executable, "-m", "flask", "bookings", "check-occupancy"]),
+]
+
+
+def postgres_url():
+    """CHECK_POSTGRES_URL with an empty public schema, or None when it can't be reached."""
+    from sqlalchemy import create_engine, text
+
+    url = os.getenv("CHECK_POSTGRES_URL", "postgresql://localhost/booking_check")
+    try:
+        engine = create_engine(url, connect_args={"connect_timeout": 3})
+        with engine.begin() as connection:
+            connection.execute(text("DROP SCHEMA public CASCADE"))
+            connection.execute(text("CREATE SCHEMA public"))
+        engine.dispose()
+    except Exception as e:
+        print(f"PostgreSQL at {url} is not reachable, skipped: {str(e).splitlines()[0]}")
+        return None
+    return url
+
+
+def run_checks(url):
+    env = dict(os.environ, DATABASE_URL=url, ARCHIVE_INTERVAL="0", FLASK_APP="app:fapp")
+    failed = []
+    for name, command in CHECKS:
+        result = subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                universal_newlines=True)
+        print(f"{'OK' if result.returncode == 0 else 'FAIL':<5} {name}")
+        if result.returncode != 0:
+            print(result.stdout[-3000:])
+            failed.append(name)
+    return failed
+
+
+def main():
+    databases = [("sqlite", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "checks.sqlite"))]
+    url = postgres_url()
+    if url:
+        databases.append(("postgresql", url))
+
+    failed = []
+    for name, url in databases:
+        print(f"== {name}")
+        failed += [f"{name}: {x}" for x in run_checks(url)]
+
+    if failed:
+        print("Failed: " + ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
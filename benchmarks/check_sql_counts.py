@@ -0,0 +1,106 @@
+"""
+Check that rendering a zone's week and the booking lists takes the same number of SQL statements however many
+bookings there are, so no lazy load per booking has crept in. Validating a booking and the role lookups, which are
+memoized per request, must take exactly the statements in EXPECTED. Exits with status 1 when a count is off.
+
+Runs against DATABASE_URL when it is set, otherwise against a temporary SQLite database.
+
+    python benchmarks/check_sql_counts.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES = [1, 10, 100, 1000]
+
+# Paths with a fixed number of statements. The gym, its zones and the roles are read once per request however often
+# they are asked for.
+EXPECTED = {
+    "validate_booking": 9,
+    "role lookups": 3,
+}
+
+
+def main():
+    if not os.getenv("DATABASE_URL"):
+        os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "sql_counts.sqlite")
+    os.environ["ARCHIVE_INTERVAL"] = "0"
+    os.chdir(ROOT)
+
+    from flask_login import login_user
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from app import fapp
+    from booking_logic import occupancy_cache, validate_booking
+    from models import db, Booking, Gym, GymBooking, User, Zone
+    from pages.bookings_list import create_bookings, gym_repeating_bookings, upcoming_bookings
+    from pages.main_page import create_heatmap
+    from time_utils import start_of_week
+    from utils import get_chosen_gym, is_admin, is_instructor
+
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    event.listen(Engine, "after_cursor_execute", count)
+
+    week = start_of_week(datetime.now())
+    paths = {
+        "create_heatmap": lambda gym, user: create_heatmap(week, gym.zones[0].id),
+        "my bookings": lambda gym, user: create_bookings(upcoming_bookings(user.id, 20)[0]),
+        "gym bookings": lambda gym, user: create_bookings(gym_repeating_bookings(gym.id)),
+        # What val_booking does for a member, the slot is free and within every limit of the gym
+        "validate_booking": lambda gym, user: validate_booking(week + timedelta(days=8, hours=21),
+                                                               week + timedelta(days=8, hours=22), 1,
+                                                               gym.zones[0].id),
+        "role lookups": lambda gym, user: [f() for f in [get_chosen_gym, is_admin, is_instructor] * 3],
+    }
+    counts = {x: [] for x in paths}
+
+    for n in SIZES:
+        with fapp.app_context():
+            gym = Gym(name=f"sql{n}", code=f"sql{n}", max_days_ahead=14, max_booking_per_user=10000,
+                      max_time_per_user_per_day=10000, max_booking_length=10000)
+            gym.zones = [Zone(name=f"Zone {i}") for i in range(4)]
+            user = User(active=True, username=f"sql{n}", email=f"sql{n}@example.com", password="", gyms=[gym],
+                        email_confirmed_at=datetime.now())
+            db.session.add_all([gym, user])
+            db.session.flush()
+            for i in range(n):
+                start = week + timedelta(days=7 + i % 7, hours=8 + i % 12)
+                zone = gym.zones[i % len(gym.zones)]
+                db.session.add(Booking(start=start, end=start + timedelta(hours=1), user_id=user.id, zone_id=zone.id))
+                db.session.add(GymBooking(start=start, end=start + timedelta(hours=1), zone_id=zone.id, repeat="w"))
+            db.session.commit()
+            gym_id, user_id = gym.id, user.id
+
+        for name, path in paths.items():
+            with fapp.test_request_context():
+                login_user(User.query.get(user_id))
+                gym = Gym.query.get(gym_id)
+                occupancy_cache.clear()
+                statements[0] = 0
+                path(gym, User.query.get(user_id))
+                counts[name].append(statements[0])
+
+    failed = False
+    print(f"{'path':<16}" + "".join(f"{n:>8}" for n in SIZES))
+    for name, values in counts.items():
+        print(f"{name:<16}" + "".join(f"{x:>8}" for x in values))
+        if name in EXPECTED:
+            failed |= any(x != EXPECTED[name] for x in values)
+        else:
+            failed |= len(set(values)) > 1
+    if failed:
+        print(f"SQL statement counts grow with the number of bookings or differ from {EXPECTED}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
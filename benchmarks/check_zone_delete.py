@@ -0,0 +1,91 @@
+"""
+Delete a zone with bookings and repeating bookings through the gym admin callback, with foreign keys enforced.
+
+Runs against DATABASE_URL when it is set, so it can be pointed at a scratch PostgreSQL database. Otherwise a temporary
+SQLite database is used with foreign keys switched on, which rejects the same writes PostgreSQL does. Exits with 1
+when the deletion fails or leaves rows behind.
+
+    DATABASE_URL=postgresql://booking@localhost/booking_check python benchmarks/check_zone_delete.py
+"""
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    if not os.getenv("DATABASE_URL"):
+        os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "zone_delete.sqlite")
+    os.environ["ARCHIVE_INTERVAL"] = "0"
+    os.environ.setdefault("OCCUPANCY_EVENTS", "db")
+    os.chdir(ROOT)
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "connect")
+    def enforce_foreign_keys(connection, record):
+        if type(connection).__module__.startswith("sqlite3"):
+            connection.execute("PRAGMA foreign_keys=ON")
+
+    import index  # noqa: F401, registers the callbacks
+    from app import fapp
+    from models import db, Booking, Gym, GymBooking, OccupancyChange, User, Zone, ZoneSlotOccupancy
+
+    fapp.config["PROPAGATE_EXCEPTIONS"] = True
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    with fapp.app_context():
+        gym = Gym(name=f"zone delete {start:%Y%m%d%H%M%S}", code=f"zd{start:%Y%m%d%H%M%S}")
+        gym.zones = [Zone(name="Kept"), Zone(name="Deleted")]
+        admin = User(active=True, username=f"zd{start:%Y%m%d%H%M%S}", email=f"zd{start:%Y%m%d%H%M%S}@example.com",
+                     password="", gyms=[gym], email_confirmed_at=datetime.now())
+        gym.admins = [admin]
+        db.session.add_all([gym, admin])
+        db.session.flush()
+        zone_id = gym.zones[1].id
+        db.session.add_all([
+            Booking(start=start + timedelta(hours=i), end=start + timedelta(hours=i + 1), user_id=admin.id,
+                    zone_id=zone_id)
+            for i in range(3)
+        ])
+        db.session.add(GymBooking(start=start, end=start + timedelta(hours=1), zone_id=zone_id, number=4, repeat="w"))
+        db.session.commit()
+        token = admin.get_id()
+
+    client = fapp.test_client()
+    with client.session_transaction() as s:
+        s["_user_id"] = token
+        s["_fresh"] = True
+
+    response = client.post("/_dash-update-component", json={
+        "output": "zone-edit.children",
+        "outputs": {"id": "zone-edit", "property": "children"},
+        "inputs": [{"id": "add-zone", "property": "n_clicks", "value": None},
+                   [{"id": {"type": "zone-delete", "id": zone_id}, "property": "n_clicks", "value": 1}]],
+        "state": [],
+        "changedPropIds": [json.dumps({"id": zone_id, "type": "zone-delete"}, separators=(",", ":")) + ".n_clicks"],
+    })
+    print(f"delete zone: HTTP {response.status_code}")
+
+    with fapp.app_context():
+        left = {
+            "zones": Zone.query.filter_by(id=zone_id).count(),
+            "bookings": Booking.query.filter_by(zone_id=zone_id).count(),
+            "gym_bookings": GymBooking.query.filter_by(zone_id=zone_id).count(),
+            "zone_slot_occupancy": ZoneSlotOccupancy.query.filter_by(zone_id=zone_id).count(),
+            "occupancy_changes": OccupancyChange.query.filter_by(zone_id=zone_id).count(),
+        }
+    print("rows left:", left)
+
+    if response.status_code != 200 or any(left.values()):
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
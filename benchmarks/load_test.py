@@ -0,0 +1,406 @@
+"""
+Replay the Dash callback traffic of simulated members and report it per callback.
+
+Every member is a thread with its own client and browser state. It loads the main page, then clicks heatmap cells,
+steps through weeks and zones and books, with a think time between actions. The requests are built from
+/_dash-dependencies like the Dash renderer builds them, and the clientside heatmap_key callback is emulated. The
+`midnight` scenario lines every member up with a selection on the day that has just opened for booking and has
+them all press "Book" at the same moment.
+
+By default the app runs in-process through the Flask test client, on a fresh synthetic database. With --url the
+requests go to a running server instead. It has to use the same database as this script, see DB_PATH and
+DATABASE_URL, because the members are taken from it and given a password to sign in with.
+
+    python benchmarks/load_test.py --members 50 --seconds 30 --scenario browse
+    python benchmarks/load_test.py --members 200 --scenario midnight
+    python benchmarks/load_test.py --url http://localhost:8050 --scale medium --members 100 --output load.json
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "load-test"
+
+CALLBACKS = {
+    "layout": "..layout.children...navbar.children...navbar.brand..",
+    "view": "view_store.data",
+    "heatmap": "data-store.data",
+    "prefetch": "prefetch_store.data",
+    "week": "..week.children...next_week.disabled...prev_week.disabled..",
+    "my_bookings": "..my-bookings.children...my-bookings-more.style...my-bookings-shown.data..",
+    "from": "from-drop-down.value",
+    "to": "to-drop-down.value",
+    "date": "date-picker.date",
+    "selection": "..msg.children...msg.color...msg.is_open...selection_store.data..",
+    "validate": "..msg2.children...msg2.color...msg2.is_open...book.disabled..",
+}
+
+LOCKED_MESSAGES = ["database is locked", "Too many simultaneous bookings"]
+
+
+class Stats:
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.locked = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.latencies.clear()
+            self.errors.clear()
+            self.locked.clear()
+
+    def record(self, label, seconds, error, locked):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            self.errors[label] += error
+            self.locked[label] += locked
+
+    def report(self, elapsed):
+        result = {}
+        for label in sorted(self.latencies):
+            values = sorted(self.latencies[label])
+            result[label] = {
+                "requests": len(values),
+                "per_second": len(values) / elapsed,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+                "errors": self.errors[label],
+                "error_rate": self.errors[label] / len(values),
+                "locked": self.locked[label],
+            }
+        return result
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class TestClientTransport:
+    """Requests through the Flask test client, signed in by putting the member in the session."""
+
+    def __init__(self, fapp, token):
+        self.client = fapp.test_client()
+        with self.client.session_transaction() as s:
+            s["_user_id"] = token
+            s["_fresh"] = True
+
+    def get(self, path):
+        r = self.client.get(path)
+        return r.status_code, r.get_data(as_text=True), r.headers
+
+    def post(self, path, body):
+        r = self.client.post(path, json=body)
+        return r.status_code, r.get_data(as_text=True), r.headers
+
+
+class HttpTransport:
+    """Requests to a running server, signed in through the Flask-User sign in form."""
+
+    def __init__(self, url, username):
+        self.url = url.rstrip("/")
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+        _, page, _ = self.get("/user/sign-in")
+        csrf = re.search(r'name="csrf_token"[^>]*value="([^"]+)"', page)
+        form = {"username": username, "password": PASSWORD, "csrf_token": csrf.group(1) if csrf else ""}
+        self.request("/user/sign-in", urllib.parse.urlencode(form).encode(),
+                     {"Content-Type": "application/x-www-form-urlencoded"})
+
+    def request(self, path, data=None, headers=None):
+        try:
+            with self.opener.open(urllib.request.Request(self.url + path, data, headers or {}), timeout=60) as r:
+                return r.status, r.read().decode(), r.headers
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode(errors="replace"), e.headers
+
+    def get(self, path):
+        return self.request(path)
+
+    def post(self, path, body):
+        return self.request(path, json.dumps(body).encode(), {"Content-Type": "application/json"})
+
+
+def harvest(component, props):
+    """Collect the properties of every component with an id in a serialized layout."""
+    if isinstance(component, list):
+        for x in component:
+            harvest(x, props)
+    elif isinstance(component, dict) and "props" in component:
+        p = component["props"]
+        if isinstance(p.get("id"), str):
+            for k, v in p.items():
+                props[f"{p['id']}.{k}"] = v
+        for v in p.values():
+            harvest(v, props)
+
+
+class Member:
+    """The browser of one simulated member."""
+
+    def __init__(self, transport, dependencies, stats, rnd):
+        self.transport = transport
+        self.dependencies = dependencies
+        self.stats = stats
+        self.rnd = rnd
+        self.props = {}
+
+    def call(self, name, changed, label=None):
+        dependency = self.dependencies[CALLBACKS[name]]
+
+        def values(specs):
+            return [
+                [] if isinstance(x["id"], dict) else
+                {"id": x["id"], "property": x["property"], "value": self.props.get(f"{x['id']}.{x['property']}")}
+                for x in specs
+            ]
+
+        outputs = [dict(id=x.split(".")[0], property=x.split(".")[1])
+                   for x in dependency["output"].strip(".").split("...")]
+        body = {
+            "output": dependency["output"],
+            "outputs": outputs if dependency["output"].startswith("..") else outputs[0],
+            "inputs": values(dependency["inputs"]),
+            "state": values(dependency["state"]),
+            "changedPropIds": changed,
+        }
+
+        t0 = time.perf_counter()
+        status, text, headers = self.transport.post("/_dash-update-component", body)
+        seconds = time.perf_counter() - t0
+
+        locked = headers.get("X-Load-Test-Locked") == "1" or any(x in text for x in LOCKED_MESSAGES)
+        self.stats.record(label or name, seconds, status >= 400, locked)
+
+        if status == 200:
+            for _id, props in json.loads(text)["response"].items():
+                for k, v in props.items():
+                    self.props[f"{_id}.{k}"] = v
+                    harvest(v, self.props)
+        return status
+
+    def set(self, key, value):
+        self.props[key] = value
+        return key
+
+    def heatmap(self):
+        selection, view = self.props["selection_store.data"], self.props["view_store.data"]
+        key = {"zone": view["zone"], "d": selection["d"], "booked": selection.get("booked") or 0}
+        if key == self.props.get("heatmap_key.data"):
+            return
+        self.call("heatmap", [self.set("heatmap_key.data", key)])
+        rendered = {"zone": key["zone"], "d": key["d"]}
+        if rendered != self.props.get("rendered_key.data"):
+            self.call("prefetch", [self.set("rendered_key.data", rendered)])
+
+    def selection_changed(self):
+        self.call("validate", ["selection_store.data"])
+        self.call("week", ["selection_store.data"])
+        self.heatmap()
+
+    def load(self):
+        t0 = time.perf_counter()
+        status, text, _ = self.transport.get("/_dash-layout")
+        self.stats.record("page", time.perf_counter() - t0, status >= 400, False)
+        harvest(json.loads(text), self.props)
+
+        self.call("layout", [self.set("location.pathname", "/")])
+        self.call("view", ["zone-picker.value"])
+        self.call("week", ["view_store.data"])
+        self.heatmap()
+        self.call("my_bookings", ["data-store.data"])
+
+    def click(self, day, slot):
+        """Click a heatmap cell, the first click of a selection picks its start and the second its end."""
+        time_label = (datetime(1, 1, 1) + timedelta(minutes=15 * slot)).strftime("%H:%M")
+        self.set("main-graph.clickData", {"points": [{"x": day.strftime("%Y-%m-%d"), "y": time_label}]})
+        for name in ["from", "to", "date"]:
+            self.call(name, ["main-graph.clickData"])
+        self.call("selection", ["from-drop-down.value", "to-drop-down.value", "date-picker.date"])
+        self.selection_changed()
+
+    def select(self, day, first_slot, last_slot):
+        self.click(day, first_slot)
+        self.click(day, last_slot)
+
+    def step_week(self):
+        button = self.rnd.choice(["next_week", "prev_week"])
+        if self.props.get(f"{button}.disabled"):
+            return
+        self.set(f"{button}.n_clicks", (self.props.get(f"{button}.n_clicks") or 0) + 1)
+        self.call("selection", [f"{button}.n_clicks"], label="week_navigation")
+        self.selection_changed()
+
+    def change_zone(self):
+        options = self.props.get("zone-picker.options") or []
+        if len(options) > 1:
+            self.set("zone-picker.value", self.rnd.choice(options)["value"])
+            self.call("view", ["zone-picker.value"])
+            self.call("week", ["view_store.data"])
+            self.heatmap()
+
+    def book(self):
+        self.set("book.n_clicks", (self.props.get("book.n_clicks") or 0) + 1)
+        self.call("selection", ["book.n_clicks"], label="book")
+        self.call("from", ["book.n_clicks"])
+        self.call("to", ["book.n_clicks"])
+        self.call("my_bookings", ["data-store.data"])
+        self.selection_changed()
+
+    def browse(self, until, think):
+        actions = [self.click_random] * 8 + [self.step_week] * 4 + [self.change_zone] * 2 + [self.book_random, self.load]
+        while time.monotonic() < until:
+            self.rnd.choice(actions)()
+            time.sleep(self.rnd.uniform(0, 2 * think))
+
+    def click_random(self):
+        week = datetime.strptime(self.props["selection_store.data"]["d"][:10], "%Y-%m-%d")
+        self.click(week + timedelta(days=self.rnd.randrange(7)), self.rnd.randrange(7 * 4, 22 * 4))
+
+    def book_random(self):
+        day = datetime.now().date() + timedelta(days=self.rnd.randrange(1, 7))
+        first = self.rnd.randrange(8 * 4, 21 * 4)
+        self.select(datetime(day.year, day.month, day.day), first, first + self.rnd.randint(2, 8))
+        self.book()
+
+
+def prepare(scale, seed, members, set_passwords):
+    """Members of the first synthetic gym, generated first when the database has none."""
+    from app import fapp, user_manager
+    from benchmarks.synthetic import SCALES, generate
+    from models import db, Gym, User, gym_memberships
+
+    with fapp.app_context():
+        gym = Gym.query.filter(Gym.code.like("synthetic%")).order_by(Gym.id).first()
+        if gym is None:
+            generate(seed=seed, **SCALES[scale])
+            gym = Gym.query.filter(Gym.code.like("synthetic%")).order_by(Gym.id).first()
+
+        user_ids = [x for x, in db.session.query(gym_memberships.c.user).filter(gym_memberships.c.gym == gym.id)
+                    .order_by(gym_memberships.c.user).limit(members + 1)][1:]
+        users = User.query.filter(User.id.in_(user_ids)).all()
+        if set_passwords:
+            password = user_manager.password_manager.hash_password(PASSWORD)
+            for user in users:
+                user.password = password
+            db.session.commit()
+        result = [(x.get_id(), x.username) for x in users], gym.max_days_ahead
+        db.session.remove()
+        return result
+
+
+def flag_locked_requests(fapp):
+    """Mark responses of requests which failed on a locked database, only possible in-process."""
+    from flask import g, got_request_exception
+
+    def on_exception(sender, exception, **extra):
+        if "database is locked" in str(exception):
+            g.load_test_locked = True
+
+    got_request_exception.connect(on_exception, fapp, weak=False)
+
+    @fapp.after_request
+    def add_locked_header(response):
+        if g.get("load_test_locked"):
+            response.headers["X-Load-Test-Locked"] = "1"
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=["browse", "midnight"], default="browse")
+    parser.add_argument("--members", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=30, help="Duration of the browse scenario")
+    parser.add_argument("--think", type=float, default=0.5, help="Mean seconds between actions of a member")
+    parser.add_argument("--url", help="Server to load instead of the in-process app")
+    parser.add_argument("--scale", default="small", help="Synthetic data to generate when there is none")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    if args.url is None and "DB_PATH" not in os.environ and "DATABASE_URL" not in os.environ:
+        os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "load.sqlite")
+    os.environ.setdefault("ARCHIVE_INTERVAL", "0")
+    os.chdir(ROOT)
+
+    members, max_days_ahead = prepare(args.scale, args.seed, args.members, args.url is not None)
+
+    if args.url:
+        transports = [lambda username=username: HttpTransport(args.url, username) for _, username in members]
+    else:
+        import index  # noqa: F401, registers the callbacks
+        from app import fapp
+
+        flag_locked_requests(fapp)
+        transports = [lambda token=token: TestClientTransport(fapp, token) for token, _ in members]
+
+    dependency_transport = transports[0]()
+    _, text, _ = dependency_transport.get("/_dash-dependencies")
+    dependencies = {x["output"]: x for x in json.loads(text)}
+
+    stats = Stats()
+    # Only what happens after every member has loaded the page is reported
+    ready = threading.Barrier(len(members) + 1, action=stats.reset)
+    opened = datetime.now().date() + timedelta(days=max_days_ahead or 7)
+
+    def run(i, transport):
+        member = Member(transport(), dependencies, stats, random.Random(args.seed * 100003 + i))
+        try:
+            member.load()
+            if args.scenario == "midnight":
+                member.select(datetime(opened.year, opened.month, opened.day), 18 * 4, 19 * 4)
+                ready.wait()
+                member.book()
+            else:
+                ready.wait()
+                member.browse(time.monotonic() + args.seconds, args.think)
+        except threading.BrokenBarrierError:
+            pass
+        except Exception:
+            ready.abort()
+            raise
+
+    threads = [threading.Thread(target=run, args=(i, t)) for i, t in enumerate(transports)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    report = stats.report(elapsed)
+    print(f"{args.scenario}: {len(members)} members, {elapsed:.1f} s")
+    print(f"{'callback':<16} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7} {'locked':>7}")
+    for label, x in report.items():
+        print(f"{label:<16} {x['requests']:>8} {x['per_second']:>8.1f} {x['p50_ms']:>8.1f} {x['p95_ms']:>8.1f} "
+              f"{x['p99_ms']:>8.1f} {x['errors']:>7} {x['locked']:>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"scenario": args.scenario, "members": len(members), "seconds": elapsed,
+                       "url": args.url, "callbacks": report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Fire concurrent bookings at a single slot from several processes and check that capacity is never exceeded.
+
+    python benchmarks/stress_admission.py --bookings 2000 --processes 8 --capacity 50
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def setup(bookings, capacity):
+    from app import fapp
+    from models import db, Gym, User, Zone
+
+    with fapp.app_context():
+        gym = Gym.query.first()
+        gym.max_people = capacity
+        gym.max_days_ahead = None
+        zone = gym.zones[0]
+        zone.max_people = capacity
+        db.session.add_all([
+            User(active=True, username=f"stress{i}", email=f"stress{i}@example.com", password="", gyms=[gym])
+            for i in range(bookings)
+        ])
+        db.session.commit()
+        return zone.id
+
+
+def worker(user_ids, zone_id, start, results):
+    from flask_login import login_user
+
+    from app import fapp
+    from booking_logic import admit_booking
+    from models import db, User
+
+    with fapp.app_context():
+        db.engine.dispose()
+
+    admitted = rejected = locked = 0
+    for user_id in user_ids:
+        with fapp.test_request_context():
+            login_user(User.query.get(user_id))
+            try:
+                admit_booking(start, start + timedelta(hours=1), 1, zone_id)
+                admitted += 1
+            except AssertionError as e:
+                if "simultaneous" in str(e):
+                    locked += 1
+                else:
+                    rejected += 1
+            db.session.remove()
+    results.put((admitted, rejected, locked))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--capacity", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "stress.sqlite")
+    os.environ["ARCHIVE_INTERVAL"] = "0"
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app import fapp
+    from models import db, Booking, User
+
+    zone_id = setup(args.bookings, args.capacity)
+    with fapp.app_context():
+        user_ids = [x for x, in db.session.query(User.id).filter(User.username.like("stress%"))]
+        db.engine.dispose()
+
+    start = (datetime.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(user_ids[i::args.processes], zone_id, start, results))
+        for i in range(args.processes)
+    ]
+
+    t0 = time.perf_counter()
+    for p in processes:
+        p.start()
+    totals = [sum(x) for x in zip(*[results.get() for _ in processes])]
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - t0
+
+    with fapp.app_context():
+        booked = db.session.query(db.func.sum(Booking.number)).filter(Booking.zone_id == zone_id).scalar() or 0
+
+    print(f"attempts:   {args.bookings} from {args.processes} processes")
+    print(f"admitted:   {totals[0]} (capacity {args.capacity}, booked persons {booked})")
+    print(f"rejected:   {totals[1]}")
+    print(f"busy:       {totals[2]}")
+    print(f"throughput: {args.bookings / elapsed:.0f} attempts/s")
+
+    if booked > args.capacity or booked != totals[0]:
+        print("OVERBOOKED")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
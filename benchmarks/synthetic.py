@@ -0,0 +1,123 @@
+"""
+Fill a database with synthetic gyms, zones, members, bookings and weekly classes.
+
+The data is reproducible for a given scale and seed. Members book about `bookings_per_week` one-off bookings a week,
+mostly in the afternoon, from `past_days` ago until `future_days` ahead. Every zone gets `classes` repeating
+bookings, most of them weekly. The first member of every gym is its admin.
+
+    DB_PATH=/tmp/large.sqlite python benchmarks/synthetic.py --scale large
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {
+    "small": dict(gyms=1, zones=3, members=300, past_days=120, future_days=14, bookings_per_week=1, classes=5),
+    "medium": dict(gyms=2, zones=4, members=2000, past_days=180, future_days=14, bookings_per_week=1, classes=10),
+    "large": dict(gyms=4, zones=6, members=5000, past_days=365, future_days=14, bookings_per_week=1, classes=20),
+}
+
+CHUNK_SIZE = 10000
+
+
+def insert(table, rows):
+    from models import db
+
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[i:i + CHUNK_SIZE])
+
+
+def next_id(model):
+    from models import db
+
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def random_start(rnd, day):
+    hour = min(max(rnd.normalvariate(17, 3), 6), 21)
+    return day + timedelta(minutes=15 * int(hour * 4))
+
+
+def generate(gyms, zones, members, past_days, future_days, bookings_per_week, classes, seed=0, prefix="synthetic"):
+    """Add the synthetic data in the current app context and return the number of rows added per table."""
+    from models import db, Booking, Gym, GymBooking, User, Zone, gym_admins, gym_memberships
+    from slot_occupancy import rebuild
+
+    rnd = random.Random(seed)
+    now = datetime.now()
+    today = datetime(now.year, now.month, now.day)
+
+    gym_id, zone_id, user_id = next_id(Gym), next_id(Zone), next_id(User)
+    gym_rows, zone_rows, user_rows, membership_rows, admin_rows = [], [], [], [], []
+    gym_zones, gym_members = {}, {}
+
+    for g in range(gyms):
+        gym_rows.append(dict(id=gym_id, name=f"{prefix} gym {gym_id}", code=f"{prefix}{gym_id}", max_people=60,
+                             max_number_per_booking=1, max_days_ahead=future_days, book_before=0,
+                             settings_version=0))
+        gym_zones[gym_id] = list(range(zone_id, zone_id + zones))
+        zone_rows += [dict(id=x, name=f"Zone {x - zone_id + 1}", gym_id=gym_id, max_people=20)
+                      for x in gym_zones[gym_id]]
+        zone_id += zones
+
+        gym_members[gym_id] = list(range(user_id, user_id + members))
+        for x in gym_members[gym_id]:
+            user_rows.append(dict(id=x, active=True, username=f"{prefix}{x}", email=f"{prefix}{x}@example.com",
+                                  email_confirmed_at=now, password="", role="USER"))
+            membership_rows.append(dict(user=x, gym=gym_id))
+        admin_rows.append(dict(user=user_id, gym=gym_id))
+        user_id += members
+        gym_id += 1
+
+    insert(Gym.__table__, gym_rows)
+    insert(Zone.__table__, zone_rows)
+    insert(User.__table__, user_rows)
+    insert(gym_memberships, membership_rows)
+    insert(gym_admins, admin_rows)
+
+    booking_rows = []
+    weeks = (past_days + future_days) / 7
+    for gym, user_ids in gym_members.items():
+        for user in user_ids:
+            for _ in range(round(weeks * bookings_per_week)):
+                start = random_start(rnd, today + timedelta(days=rnd.randrange(-past_days, future_days)))
+                booking_rows.append(dict(user_id=user, zone_id=rnd.choice(gym_zones[gym]), number=1, start=start,
+                                         end=start + timedelta(minutes=15 * rnd.randint(4, 12))))
+    insert(Booking.__table__, booking_rows)
+
+    class_rows = []
+    for zone_ids in gym_zones.values():
+        for zone in zone_ids:
+            for _ in range(classes):
+                start = random_start(rnd, today - timedelta(days=rnd.randrange(past_days + 1)))
+                class_rows.append(dict(zone_id=zone, number=rnd.randint(4, 10), start=start,
+                                       end=start + timedelta(minutes=15 * rnd.randint(4, 8)),
+                                       repeat=rnd.choice(["w", "w", "w", "bw", "m"]), repeat_end=None))
+    insert(GymBooking.__table__, class_rows)
+
+    db.session.commit()
+    rebuild()
+
+    return {"gyms": len(gym_rows), "zones": len(zone_rows), "users": len(user_rows),
+            "bookings": len(booking_rows), "gym_bookings": len(class_rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import fapp
+
+    with fapp.app_context():
+        print(generate(seed=args.seed, **SCALES[args.scale]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,29 @@
+import random
+import time
 from datetime import datetime, timedelta
 
 import humanize
-import numpy as np
 from flask_login import current_user
 from sqlalchemy import or_
+from sqlalchemy.exc import OperationalError
 
-from models import Booking, GymBooking
+import config
+from models import Booking, GymBooking, Zone, db
+from occupancy import SLOT_MINUTES, SLOTS_PER_DAY, OccupancyCache, booking_occupancy, repeating_occupancy
+from slot_occupancy import slot_occupancy
 from time_utils import start_of_day, start_of_week, timeslot_index
-from utils import get_chosen_gym, is_admin, get_zone, is_instructor
+from utils import get_chosen_gym, is_admin, get_zone, is_instructor, get_zones
 
-TS_M = 15
+TS_M = SLOT_MINUTES
 TS_S = TS_M * 60
 
+occupancy_cache = OccupancyCache(config.OCCUPANCY_CACHE_SIZE, config.OCCUPANCY_CACHE_TTL)
 
-def create_from_to(f, t, days):
-    new_booking = np.zeros(24 * 4 * days)
-    for x in range(f, t):
-        new_booking[x] += 1
-    return new_booking
 
-
-def create_daily_from_to(f, t):
-    new_booking = np.zeros(24 * 4)
-    for x in range(f, t):
-        new_booking[x] += 1
-    return new_booking
-
-
-def validate_booking(start, end, number, zone_id):
+def validate_booking(start, end, number, zone_id, cached=True):
 
     gym = get_chosen_gym()
-    if zone_id not in [x.id for x in gym.zones]:
+    if zone_id not in get_zones():
         raise AssertionError("The zone has been removed. Please refresh page and try again.")
 
     zone = get_zone(zone_id)
@@ -43,12 +36,11 @@ def validate_booking(start, end, number, zone_id):
         raise AssertionError("Start must come before end")
 
     # Then we check capacity
-    all_bookings = create_daily_booking_map(start, zone_id)
-
-    start_end_array = create_daily_from_to(timeslot_index(start), timeslot_index(end)) * number
-    if zone.max_people and np.any((all_bookings + start_end_array) > zone.max_people):
+    daily = create_daily_booking_map(start, zone_id, cached)
+    peak = daily[timeslot_index(start):timeslot_index(end)].max(initial=0) + number
+    if zone.max_people and peak > zone.max_people:
         raise AssertionError(f"Booking exceeds zone capacity")
-    elif gym.max_people and np.any((all_bookings + start_end_array) > gym.max_people):
+    elif gym.max_people and peak > gym.max_people:
         raise AssertionError(f"Booking exceeds gym capacity")
 
     if is_admin() or is_instructor():
@@ -61,14 +53,7 @@ def validate_booking(start, end, number, zone_id):
         if start.date() > datetime.now().date() + timedelta(days=gym.max_days_ahead):
             raise AssertionError(f"Bookings can only be {gym.max_days_ahead} days into the future")
 
-    overlapping = [
-        x for x in current_user.bookings if
-        (start <= x.start < end) or
-        (start < x.end <= end) or
-        (x.start <= start and x.end >= end)
-    ]
-
-    if len(overlapping) > 0:
+    if db.session.query(user_overlapping_bookings(current_user.id, start, end).exists()).scalar():
         raise AssertionError(
             f"Selection is overlapping with another booking")
 
@@ -77,79 +62,143 @@ def validate_booking(start, end, number, zone_id):
         raise AssertionError(f"Max booking length is {maxlen}")
 
     book_before = gym.book_before if gym.book_before is not None else 0
-    active_bookings = len([x for x in current_user.bookings if x.end - timedelta(minutes=TS_M*book_before) >= datetime.now()])
+    active_bookings = user_active_bookings(current_user.id, datetime.now() + timedelta(minutes=TS_M*book_before)).count()
 
     if gym.max_booking_per_user is not None and \
             active_bookings >= gym.max_booking_per_user:
         raise AssertionError(f"You can only have {gym.max_booking_per_user} active bookings")
 
     if gym.max_time_per_user_per_day is not None:
-        total_seconds = sum((x.end - x.start).total_seconds() for x in current_user.bookings if x.start.date() == start.date())
+        total_seconds = sum((e - s).total_seconds() for s, e in user_daily_bookings(current_user.id, start_of_day(start)))
         if ((total_seconds + (end - start).total_seconds()) / TS_S) > gym.max_time_per_user_per_day:
             maxlen = humanize.precisedelta(timedelta(seconds=gym.max_time_per_user_per_day * TS_S))
             raise AssertionError(f"You can not book more than {maxlen} per day")
 
 
-def create_repeating_booking_map(start, days, zone_id):
-    all_bookings = np.zeros(24 * 4 * days)
+def zone_bookings(zone_id, start, end):
+    return db.session.query(Booking.start, Booking.end, Booking.number, Booking.user_id)\
+        .filter(Booking.zone_id == zone_id)\
+        .filter(Booking.start >= start)\
+        .filter(Booking.end <= end)
+
+
+def zone_repeating_bookings(zone_id, start, end):
+    return GymBooking.query\
+        .filter(GymBooking.zone_id == zone_id)\
+        .filter(GymBooking.start < end)\
+        .filter(or_(GymBooking.repeat_end == None, GymBooking.repeat_end >= start))
+
+
+def begin_admission(zone_id):
+    """
+    Start a transaction which serializes bookings of zone_id until it is committed.
+
+    SQLite only has one writer, so BEGIN IMMEDIATE takes the write lock up front and validation always sees
+    every committed booking. Other databases lock just the zone row, leaving unrelated zones unaffected.
+
+    The session must not have pending changes. The transaction it is in is rolled back first, along with anything
+    that was already flushed in it.
+    """
+    # AssertionError is shown to the user as a validation message, this is a bug in the caller
+    if db.session.new or db.session.dirty or db.session.deleted:
+        raise RuntimeError("Admission started with pending changes in the session")
+    db.session.rollback()
+    connection = db.session.connection()
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        db.session.query(Zone.id).filter(Zone.id == zone_id).with_for_update().first()
+
+
+def admit_booking(start, end, number, zone_id):
+    """Validate and insert a booking for the current user atomically, retrying while the database is busy."""
+    for attempt in range(config.ADMISSION_RETRIES + 1):
+        try:
+            begin_admission(zone_id)
+            validate_booking(start, end, number, zone_id, cached=False)
+            booking = Booking(start=start, end=end, user_id=current_user.id, zone_id=zone_id, number=number)
+            db.session.add(booking)
+            db.session.commit()
+            occupancy_cache.invalidate(zone_id)
+            return booking
+        except OperationalError:
+            db.session.rollback()
+            if attempt == config.ADMISSION_RETRIES:
+                raise AssertionError("Too many simultaneous bookings. Please try again.")
+            time.sleep(config.ADMISSION_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def user_overlapping_bookings(user_id, start, end):
+    return Booking.query\
+        .filter(Booking.user_id == user_id)\
+        .filter(Booking.end > start)\
+        .filter(Booking.start < end)
+
+
+def user_active_bookings(user_id, ends_after):
+    return Booking.query\
+        .filter(Booking.user_id == user_id)\
+        .filter(Booking.end >= ends_after)
+
+
+def user_daily_bookings(user_id, day):
+    return db.session.query(Booking.start, Booking.end)\
+        .filter(Booking.user_id == user_id)\
+        .filter(Booking.end > day)\
+        .filter(Booking.start >= day)\
+        .filter(Booking.start < day + timedelta(days=1))
 
-    for b in GymBooking.query\
-            .filter(GymBooking.start < (start + timedelta(days=days)))\
-            .filter(or_(GymBooking.repeat_end == None, GymBooking.repeat_end >= start))\
-            .filter_by(zone_id=zone_id).all():
 
-        if b.repeat == "w":
+def create_repeating_booking_map(start, days, zone_id):
+    rows = zone_repeating_bookings(zone_id, start, start + timedelta(days=days))\
+        .with_entities(GymBooking.start, GymBooking.end, GymBooking.number, GymBooking.repeat, GymBooking.repeat_end)\
+        .all()
+    return repeating_occupancy(rows, start, days)
 
-            for dt in range(days):
-                _day = start + timedelta(days=dt)
-                if _day.weekday() == b.start.weekday():
-                    new_start = b.start.replace(year=_day.year, month=_day.month, day=_day.day)
-                    new_end = b.end.replace(year=_day.year, month=_day.month, day=_day.day)
-                    start_ts = timeslot_index(new_start, start)
-                    end_ts = timeslot_index(new_end, start)
-                    start_end_array = create_from_to(start_ts, end_ts, days) * b.number
 
-                    all_bookings += start_end_array
+def user_zone_bookings(user_id, zone_id, start, end):
+    return db.session.query(Booking.start, Booking.end, Booking.number)\
+        .filter(Booking.user_id == user_id)\
+        .filter(Booking.end <= end)\
+        .filter(Booking.zone_id == zone_id)\
+        .filter(Booking.start >= start)
 
-    return all_bookings
 
+def create_zone_occupancy(start, days, zone_id):
+    all_bookings = slot_occupancy(zone_id, start, days)
+    all_bookings += create_repeating_booking_map(start, days, zone_id)
+    return all_bookings
 
-def create_daily_booking_map(d, zone_id):
 
-    day = start_of_day(d)
+def zone_week_occupancy(zone_id, week_start_day):
+    return occupancy_cache.get(zone_id, week_start_day, lambda: create_zone_occupancy(week_start_day, 7, zone_id))
 
-    all_bookings = create_repeating_booking_map(day, 1, zone_id) #np.zeros(24 * 4)
 
-    for b in Booking.query.filter(Booking.start >= day).filter(Booking.end <= day + timedelta(days=1)).filter_by(zone_id=zone_id).all():
-        start = (b.start - day).total_seconds() / TS_S
-        end = (b.end - day).total_seconds() / TS_S
+def create_daily_booking_map(d, zone_id, cached=True):
 
-        start_end_array = create_daily_from_to(int(start), int(end)) * b.number
+    day = start_of_day(d)
 
-        all_bookings += start_end_array
+    if not cached:
+        return create_zone_occupancy(day, 1, zone_id)
 
-    return all_bookings
+    offset = day.weekday() * SLOTS_PER_DAY
+    return zone_week_occupancy(zone_id, start_of_week(day))[offset:offset + SLOTS_PER_DAY]
 
 
 def create_weekly_booking_map(d, zone, days=7):
     week_start_day = start_of_week(d)
     week_end = week_start_day + timedelta(days=days)
 
-    all_bookings = np.zeros(24 * 4 * days)
-    my_bookings = np.zeros(24 * 4 * days)
-
-    for b in Booking.query.filter(Booking.start >= week_start_day).filter(
-            Booking.end <= week_end).filter_by(zone_id=zone).all():
-        start = timeslot_index(b.start, week_start_day)
-        end = timeslot_index(b.end, week_start_day)
-
-        start_end_array = create_from_to(start, end, days) * b.number
-
-        all_bookings += start_end_array
-
-        if current_user and b.user.id == current_user.id:
-            my_bookings += start_end_array
+    if days == 7:
+        all_bookings = zone_week_occupancy(zone, week_start_day).copy()
+    else:
+        all_bookings = create_zone_occupancy(week_start_day, days, zone)
 
-    all_bookings += create_repeating_booking_map(week_start_day, days, zone)
+    my_bookings = booking_occupancy(
+        user_zone_bookings(current_user.id, zone, week_start_day, week_end).all() if current_user else [],
+        week_start_day, days)
 
     return all_bookings, my_bookings
@@ -0,0 +1,42 @@
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import Booking, Gym, GymBooking, User, Zone
+
+
+def _values(b, key):
+    """Old and new values of an attribute, loaded relationships included."""
+    return {x for x in inspect(b).attrs[key].history.sum() if x is not None}
+
+
+def changed_owners(session):
+    """Users whose bookings and zones whose repeating bookings were added, changed or deleted in this flush."""
+    user_ids, zone_ids = set(), set()
+    dirty = [x for x in session.dirty if session.is_modified(x)]
+    for b in list(session.new) + list(session.deleted) + dirty:
+        if isinstance(b, Booking):
+            user_ids |= _values(b, "user_id")
+        elif isinstance(b, GymBooking):
+            zone_ids |= _values(b, "zone_id") | {x.id for x in _values(b, "zone")}
+    return user_ids, zone_ids
+
+
+def _after_flush(session, flush_context):
+    # Foreign keys set through relationships are populated by now, and the history still tells the old values
+    user_ids, zone_ids = changed_owners(session)
+    connection = session.connection()
+
+    if user_ids:
+        users = User.__table__
+        connection.execute(users.update().where(users.c.id.in_(user_ids))
+                           .values(bookings_version=users.c.bookings_version + 1))
+    if zone_ids:
+        gyms = Gym.__table__
+        gym_ids = select(Zone.gym_id).where(Zone.id.in_(zone_ids))
+        connection.execute(gyms.update().where(gyms.c.id.in_(gym_ids))
+                           .values(bookings_version=gyms.c.bookings_version + 1))
+
+
+def init_booking_versions():
+    """Bump users.bookings_version and gyms.bookings_version on every ORM write of their bookings."""
+    event.listen(Session, "after_flush", _after_flush)
@@ -5,4 +5,75 @@ CLOSE = 2
 ROWS = 6
 COLUMNS = int(24 / ROWS)
 
-DB_PATH = os.getenv('DB_PATH', 'basic_app.sqlite')
\ No newline at end of file
+DB_PATH = os.getenv('DB_PATH', 'basic_app.sqlite')
+
+DATABASE_URL = (os.getenv('DATABASE_URL') or 'sqlite:///' + DB_PATH).replace('postgres://', 'postgresql://', 1)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+
+
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', '1') == '1'
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024))
+SQLITE_STATEMENT_CACHE = int(os.getenv('SQLITE_STATEMENT_CACHE', 256))
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 5))
+
+
+def engine_options(url=DATABASE_URL):
+    if url.startswith('sqlite'):
+        if not SQLITE_PROFILE or url in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        from sqlalchemy.pool import QueuePool
+        return {
+            'poolclass': QueuePool,
+            'pool_size': SQLITE_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'connect_args': {
+                'timeout': SQLITE_BUSY_TIMEOUT / 1000,
+                'cached_statements': SQLITE_STATEMENT_CACHE,
+                'check_same_thread': False,
+            },
+        }
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+
+OCCUPANCY_CACHE_SIZE = int(os.getenv('OCCUPANCY_CACHE_SIZE', 256))
+OCCUPANCY_CACHE_TTL = int(os.getenv('OCCUPANCY_CACHE_TTL', 30))
+LAYOUT_CACHE_SIZE = int(os.getenv('LAYOUT_CACHE_SIZE', 128))
+USER_SEARCH_LIMIT = int(os.getenv('USER_SEARCH_LIMIT', 20))
+ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', 25))
+MY_BOOKINGS_PAGE_SIZE = int(os.getenv('MY_BOOKINGS_PAGE_SIZE', 20))
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 30))
+ARCHIVE_CHUNK_SIZE = int(os.getenv('ARCHIVE_CHUNK_SIZE', 500))
+ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', 3600))
+
+ADMISSION_RETRIES = int(os.getenv('ADMISSION_RETRIES', 5))
+ADMISSION_BACKOFF = float(os.getenv('ADMISSION_BACKOFF', 0.05))
+
+METRICS = os.getenv('METRICS', '1') == '1'
+
+PREFETCH = os.getenv('PREFETCH', '1') == '1'
+PREFETCH_ZONES = int(os.getenv('PREFETCH_ZONES', 8))
+
+OCCUPANCY_EVENTS = os.getenv('OCCUPANCY_EVENTS', 'db')  # db, local or off
+OCCUPANCY_EVENTS_POLL = float(os.getenv('OCCUPANCY_EVENTS_POLL', 1))
+# Seconds a change may commit after changes with higher ids did, ids are not committed in order on PostgreSQL
+OCCUPANCY_EVENTS_POLL_LAG = int(os.getenv('OCCUPANCY_EVENTS_POLL_LAG', 10))
+OCCUPANCY_EVENTS_BUFFER = int(os.getenv('OCCUPANCY_EVENTS_BUFFER', 64))
+# Per worker. Streams are greenlets under gunicorn's gevent worker, under a threaded worker each holds a thread.
+OCCUPANCY_EVENTS_MAX_CLIENTS = int(os.getenv('OCCUPANCY_EVENTS_MAX_CLIENTS', 500))
+OCCUPANCY_EVENTS_KEEPALIVE = int(os.getenv('OCCUPANCY_EVENTS_KEEPALIVE', 15))
+OCCUPANCY_EVENTS_STREAM_SECONDS = int(os.getenv('OCCUPANCY_EVENTS_STREAM_SECONDS', 60))
+OCCUPANCY_EVENTS_RETRY = int(os.getenv('OCCUPANCY_EVENTS_RETRY', 2000))
+OCCUPANCY_EVENTS_RETENTION = int(os.getenv('OCCUPANCY_EVENTS_RETENTION', 3600))
@@ -0,0 +1,9 @@
+# Loaded by gunicorn from the working directory, the worker settings are on the command line in the Dockerfile
+
+
+def post_fork(server, worker):
+    # Under the gevent worker psycopg2 has to wait for PostgreSQL cooperatively too, or a query blocks every request
+    # of the worker. SQLite queries are short, local and left blocking.
+    if worker.__class__.__name__.startswith("Gevent"):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -0,0 +1,81 @@
+import base64
+
+import numpy as np
+
+from occupancy import SLOT_MINUTES, SLOTS_PER_DAY
+
+# Cell states, painted over the occupancy by set_fig in assets/script.js
+FREE = 0
+MINE = 1
+SELECTED = 2
+CLOSED = 3
+
+
+def encode_array(a, dtype):
+    return base64.b64encode(np.ascontiguousarray(a, dtype=dtype).tobytes()).decode("ascii")
+
+
+def decode_array(s, dtype):
+    return np.frombuffer(base64.b64decode(s), dtype=dtype)
+
+
+def state_runs(states):
+    """Runs of equal, non-free states as [first index, length, state]."""
+    states = np.asarray(states)
+    if len(states) == 0:
+        return []
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(states)) + 1])
+    lengths = np.diff(np.concatenate([starts, [len(states)]]))
+    return [[int(i), int(n), int(states[i])] for i, n in zip(starts, lengths) if states[i] != FREE]
+
+
+def encode_occupancy(occupancy):
+    """
+    Occupancy as (encoding, base64 string).
+
+    Occupancy changes in small steps from slot to slot, so it is normally sent as int8 differences ("delta"),
+    falling back to little endian int16 values ("i2") when a step does not fit.
+    """
+    values = np.clip(np.rint(occupancy), -2 ** 15, 2 ** 15 - 1).astype(np.int64)
+    deltas = np.diff(values, prepend=0)
+    if len(deltas) == 0 or (deltas.min() >= -2 ** 7 and deltas.max() < 2 ** 7):
+        return "delta", encode_array(deltas, "i1")
+    return "i2", encode_array(values, "<i2")
+
+
+def decode_occupancy(encoding, s):
+    if encoding == "delta":
+        return np.cumsum(decode_array(s, "i1"), dtype=np.int64)
+    return decode_array(s, "<i2").astype(np.int64)
+
+
+def encode_heatmap(zone_id, week_start, occupancy, states, max_people, close, changes=None):
+    """
+    Compact data-store payload for a heatmap, decoded by set_fig in assets/script.js.
+
+    Occupancy and states are in slot order, day by day. The axis labels are not sent, set_fig derives them from
+    start, days and slot_minutes. `changes` is the id of the latest occupancy change included, pushed changes up
+    to it are skipped by the browser.
+    """
+    encoding, data = encode_occupancy(occupancy)
+    return {
+        "zone": zone_id,
+        "start": week_start.strftime("%Y-%m-%d"),
+        "days": len(occupancy) // SLOTS_PER_DAY,
+        "slot_minutes": SLOT_MINUTES,
+        "encoding": encoding,
+        "occupancy": data,
+        "states": state_runs(states),
+        "max": max_people,
+        "close": close,
+        "changes": changes,
+    }
+
+
+def decode_heatmap(data):
+    """Inverse of encode_heatmap, returns (occupancy, states) as flat arrays."""
+    occupancy = decode_occupancy(data["encoding"], data["occupancy"])
+    states = np.zeros(len(occupancy), dtype=np.uint8)
+    for i, n, state in data["states"]:
+        states[i:i + n] = state
+    return occupancy, states
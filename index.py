@@ -23,6 +23,11 @@ app.layout = html.Div([
                                           "source": None}),
     dcc.Store(id="bookings_store", data={}),
     dcc.Store(id="data-store", data={}),
+    dcc.Store(id="heatmap_key", data={}),
+    dcc.Store(id="rendered_key", data={}),
+    dcc.Store(id="prefetch_store", data={}),
+    # Clicked by assets/script.js when a pushed change can not be applied to the heatmap in place
+    html.Button(id="heatmap-refresh", style={"display": "none"}),
     dcc.Store(id="view_store", data={"show": "peak", "zone": None}, storage_type='local'),
     dcc.Location(id="location"),
     html.Div(id="redirect"),
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class LayoutCache:
+    """
+    Bounded LRU cache of component trees.
+
+    Cached trees are shared between requests and threads, so they must never be modified after they are built.
+    Keys should include a version which is bumped when the source changes, old entries are then evicted as they
+    fall out of use.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        self.misses += 1
+        value = build()
+
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
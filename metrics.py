@@ -0,0 +1,173 @@
+import os
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+from flask import Response, abort, g, has_request_context, request
+from flask_login import current_user
+from flask_user import login_required, allow_unconfirmed_email
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SQL_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576]
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for le, n in zip(self.buckets + ["+Inf"], self.counts):
+            cumulative += n
+            yield le, cumulative
+
+
+class Series:
+    """Everything recorded for one callback or view."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.sql_statements = Histogram(SQL_BUCKETS)
+        self.sql_seconds = 0.0
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+
+
+class Registry:
+    """
+    Request metrics of this process.
+
+    Every worker keeps its own, so all series carry a worker label and can be summed over workers when queried.
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.lock = Lock()
+
+    def record(self, labels, seconds, statements, sql_seconds, size, error):
+        with self.lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = Series()
+            s.requests += 1
+            s.errors += error
+            s.latency.observe(seconds)
+            s.sql_statements.observe(statements)
+            s.sql_seconds += sql_seconds
+            if size is not None:
+                s.response_bytes.observe(size)
+
+    def render(self):
+        worker = str(os.getpid())
+        with self.lock:
+            items = sorted(self.series.items())
+            lines = []
+
+            def metric(name, kind, text, values):
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (_kind, _name), s in items:
+                    labels = f'kind="{escape(_kind)}",name="{escape(_name)}",worker="{worker}"'
+                    value = values(s)
+                    if isinstance(value, Histogram):
+                        for le, n in value.samples():
+                            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {n}')
+                        lines.append(f"{name}_sum{{{labels}}} {value.sum}")
+                        lines.append(f"{name}_count{{{labels}}} {value.count}")
+                    else:
+                        lines.append(f"{name}{{{labels}}} {value}")
+
+            metric("booking_requests_total", "counter", "Handled requests.", lambda s: s.requests)
+            metric("booking_request_errors_total", "counter", "Requests which failed with a server error.",
+                   lambda s: s.errors)
+            metric("booking_request_seconds", "histogram", "Request latency.", lambda s: s.latency)
+            metric("booking_request_sql_statements", "histogram", "SQL statements executed per request.",
+                   lambda s: s.sql_statements)
+            metric("booking_request_sql_seconds_total", "counter", "Time spent executing SQL statements.",
+                   lambda s: s.sql_seconds)
+            metric("booking_response_bytes", "histogram", "Response body size.", lambda s: s.response_bytes)
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "metrics_start" in g:
+        conn.info["metrics_query_start"] = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("metrics_query_start", None)
+    if start is not None and has_request_context() and "metrics_start" in g:
+        g.metrics_sql_statements += 1
+        g.metrics_sql_seconds += perf_counter() - start
+
+
+def request_labels(app, dash_update_path):
+    """(kind, name) of the current request, Dash callbacks are labeled by their output id."""
+    if request.path == dash_update_path:
+        body = request.get_json(silent=True)
+        output = body.get("output") if isinstance(body, dict) else None
+        # The output comes from the client, only registered ones become series
+        return "callback", output if isinstance(output, str) and output in app.callback_map else "unknown"
+    return "view", request.endpoint or "unmatched"
+
+
+def metrics_view():
+    if current_user.role != "ADMIN":
+        abort(403)
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(fapp, app):
+    """Record latency, SQL statements and response size of signed in users' callbacks and views, see /metrics."""
+    if not config.METRICS:
+        return
+
+    dash_update_path = app.config.requests_pathname_prefix + "_dash-update-component"
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    @fapp.before_request
+    def start_metrics():
+        g.metrics_start = perf_counter()
+        g.metrics_sql_statements = 0
+        g.metrics_sql_seconds = 0.0
+        g.metrics_size = None
+
+    @fapp.after_request
+    def measure_response(response):
+        if not response.is_streamed:
+            g.metrics_size = response.calculate_content_length()
+        g.metrics_status = response.status_code
+        return response
+
+    @fapp.teardown_request
+    def record_metrics(exc):
+        if "metrics_start" not in g or not current_user.is_authenticated:
+            return
+        error = exc is not None or g.get("metrics_status", 500) >= 500
+        registry.record(request_labels(app, dash_update_path), perf_counter() - g.metrics_start,
+                        g.metrics_sql_statements, g.metrics_sql_seconds, g.metrics_size, error)
+
+    fapp.add_url_rule("/metrics", "metrics", allow_unconfirmed_email(login_required(metrics_view)))
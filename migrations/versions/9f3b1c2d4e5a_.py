@@ -0,0 +1,28 @@
+"""Add composite indexes for booking range queries
+
+Revision ID: 9f3b1c2d4e5a
+Revises: e7eb7193a0b5
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3b1c2d4e5a'
+down_revision = 'e7eb7193a0b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_bookings_zone_id_start_end', 'bookings', ['zone_id', 'start', 'end'], unique=False)
+    op.create_index('ix_bookings_user_id_end', 'bookings', ['user_id', 'end'], unique=False)
+    op.create_index('ix_gym_bookings_zone_id_start_repeat_end', 'gym_bookings', ['zone_id', 'start', 'repeat_end'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_gym_bookings_zone_id_start_repeat_end', table_name='gym_bookings')
+    op.drop_index('ix_bookings_user_id_end', table_name='bookings')
+    op.drop_index('ix_bookings_zone_id_start_end', table_name='bookings')
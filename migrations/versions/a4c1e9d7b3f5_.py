@@ -0,0 +1,28 @@
+"""Index gym role and membership tables by gym
+
+Revision ID: a4c1e9d7b3f5
+Revises: f2b7d4c9a1e6
+Create Date: 2026-10-18 20:14:05.528311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c1e9d7b3f5'
+down_revision = 'f2b7d4c9a1e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_gym_admins_gym', 'gym_admins', ['gym'], unique=False)
+    op.create_index('ix_gym_instructors_gym', 'gym_instructors', ['gym'], unique=False)
+    op.create_index('ix_gym_memberships_gym', 'gym_memberships', ['gym'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_gym_memberships_gym', table_name='gym_memberships')
+    op.drop_index('ix_gym_instructors_gym', table_name='gym_instructors')
+    op.drop_index('ix_gym_admins_gym', table_name='gym_admins')
@@ -0,0 +1,31 @@
+"""Add zone_slot_occupancy table
+
+Revision ID: b41e7d9a0c62
+Revises: 9f3b1c2d4e5a
+Create Date: 2026-10-18 13:40:05.918230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41e7d9a0c62'
+down_revision = '9f3b1c2d4e5a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('zone_slot_occupancy',
+    sa.Column('zone_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('slot', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['zone_id'], ['zones.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('zone_id', 'day', 'slot')
+    )
+
+
+def downgrade():
+    op.drop_table('zone_slot_occupancy')
@@ -0,0 +1,24 @@
+"""Index gyms by lowercase name
+
+Revision ID: b8e2f4a6c0d3
+Revises: a4c1e9d7b3f5
+Create Date: 2026-10-18 21:02:41.118420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f4a6c0d3'
+down_revision = 'a4c1e9d7b3f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_gyms_name_lower', 'gyms', [sa.text('lower(name)'), 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_gyms_name_lower', table_name='gyms')
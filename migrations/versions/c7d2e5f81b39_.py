@@ -0,0 +1,37 @@
+"""Add bookings_archive table
+
+Revision ID: c7d2e5f81b39
+Revises: b41e7d9a0c62
+Create Date: 2026-10-18 15:02:47.553108
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e5f81b39'
+down_revision = 'b41e7d9a0c62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bookings_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('number', sa.Integer(), nullable=True),
+    sa.Column('start', sa.DateTime(), nullable=False),
+    sa.Column('end', sa.DateTime(), nullable=False),
+    sa.Column('note', sa.String(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('zone_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['zone_id'], ['zones.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_bookings_archive_user_id_end', 'bookings_archive', ['user_id', 'end'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_bookings_archive_user_id_end', table_name='bookings_archive')
+    op.drop_table('bookings_archive')
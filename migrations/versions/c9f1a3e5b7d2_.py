@@ -0,0 +1,26 @@
+"""Add users.bookings_version and gyms.bookings_version
+
+Revision ID: c9f1a3e5b7d2
+Revises: b8e2f4a6c0d3
+Create Date: 2026-10-18 21:47:12.604381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f1a3e5b7d2'
+down_revision = 'b8e2f4a6c0d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('bookings_version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('gyms', sa.Column('bookings_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('gyms', 'bookings_version')
+    op.drop_column('users', 'bookings_version')
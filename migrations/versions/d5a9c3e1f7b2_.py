@@ -0,0 +1,26 @@
+"""Case-insensitive unique indexes on users
+
+Revision ID: d5a9c3e1f7b2
+Revises: c7d2e5f81b39
+Create Date: 2026-10-18 16:25:13.720944
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a9c3e1f7b2'
+down_revision = 'c7d2e5f81b39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)')], unique=True)
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.drop_index('ix_users_username_lower', table_name='users')
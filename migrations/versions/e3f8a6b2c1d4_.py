@@ -0,0 +1,36 @@
+"""Add occupancy_changes table
+
+Revision ID: e3f8a6b2c1d4
+Revises: d5a9c3e1f7b2
+Create Date: 2026-10-18 18:11:36.284519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3f8a6b2c1d4'
+down_revision = 'd5a9c3e1f7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('occupancy_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('zone_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=True),
+    sa.Column('first_slot', sa.Integer(), nullable=True),
+    sa.Column('last_slot', sa.Integer(), nullable=True),
+    sa.Column('delta', sa.Integer(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['zone_id'], ['zones.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_occupancy_changes_zone_id_id', 'occupancy_changes', ['zone_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_occupancy_changes_zone_id_id', table_name='occupancy_changes')
+    op.drop_table('occupancy_changes')
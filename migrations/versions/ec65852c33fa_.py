@@ -17,6 +17,9 @@ depends_on = None
 
 
 def upgrade():
+    # NOCASE only exists on SQLite, other databases rely on the lower() indexes added in a later revision
+    nocase = 'NOCASE' if op.get_context().dialect.name == 'sqlite' else None
+
     # ### commands auto generated by Alembic - please adjust! ###
     op.create_table('gyms',
     sa.Column('id', sa.Integer(), nullable=False),
@@ -35,11 +38,11 @@ def upgrade():
     op.create_table('users',
     sa.Column('id', sa.Integer(), nullable=False),
     sa.Column('is_active', sa.Boolean(), server_default='1', nullable=False),
-    sa.Column('username', sa.String(length=255, collation='NOCASE'), nullable=False),
-    sa.Column('email', sa.String(length=255, collation='NOCASE'), nullable=False),
+    sa.Column('username', sa.String(length=255, collation=nocase), nullable=False),
+    sa.Column('email', sa.String(length=255, collation=nocase), nullable=False),
     sa.Column('email_confirmed_at', sa.DateTime(), nullable=True),
     sa.Column('password', sa.String(length=255), server_default='', nullable=False),
-    sa.Column('role', sa.String(length=100, collation='NOCASE'), nullable=False),
+    sa.Column('role', sa.String(length=100, collation=nocase), nullable=False),
     sa.PrimaryKeyConstraint('id'),
     sa.UniqueConstraint('email'),
     sa.UniqueConstraint('username')
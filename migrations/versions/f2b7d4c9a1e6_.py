@@ -0,0 +1,24 @@
+"""Add gyms.settings_version
+
+Revision ID: f2b7d4c9a1e6
+Revises: e3f8a6b2c1d4
+Create Date: 2026-10-18 19:02:47.913204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7d4c9a1e6'
+down_revision = 'e3f8a6b2c1d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('gyms', sa.Column('settings_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('gyms', 'settings_version')
@@ -4,27 +4,32 @@ from datetime import datetime
 from flask_migrate import stamp, upgrade
 from flask_sqlalchemy import SQLAlchemy
 from flask_user import UserMixin
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import column_property
 
-from config import DB_PATH
 
 db = SQLAlchemy()
 
+# The primary keys answer role and membership checks of a user, the gym indexes list a gym's people
 gym_admins = db.Table(
     'gym_admins',
     db.Column('user', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('gym', db.Integer, db.ForeignKey('gyms.id'), primary_key=True)
+    db.Column('gym', db.Integer, db.ForeignKey('gyms.id'), primary_key=True),
+    db.Index('ix_gym_admins_gym', 'gym')
 )
 
 gym_instructors = db.Table(
     'gym_instructors',
     db.Column('user', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('gym', db.Integer, db.ForeignKey('gyms.id'), primary_key=True)
+    db.Column('gym', db.Integer, db.ForeignKey('gyms.id'), primary_key=True),
+    db.Index('ix_gym_instructors_gym', 'gym')
 )
 
 gym_memberships = db.Table(
     'gym_memberships',
     db.Column('user', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('gym', db.Integer, db.ForeignKey('gyms.id'), primary_key=True)
+    db.Column('gym', db.Integer, db.ForeignKey('gyms.id'), primary_key=True),
+    db.Index('ix_gym_memberships_gym', 'gym')
 )
 
 
@@ -32,14 +37,22 @@ class User(db.Model, UserMixin):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     active = db.Column('is_active', db.Boolean(), nullable=False, server_default='1')
-    username = db.Column(db.String(255, collation='NOCASE'), nullable=False, unique=True)
-    email = db.Column(db.String(255, collation='NOCASE'), nullable=False, unique=True)
+    username = db.Column(db.String(255), nullable=False, unique=True)
+    email = db.Column(db.String(255), nullable=False, unique=True)
     email_confirmed_at = db.Column(db.DateTime())
     password = db.Column(db.String(255), nullable=False, server_default='')
-    role = db.Column(db.String(100, collation='NOCASE'), nullable=False, default="USER")
+    role = db.Column(db.String(100), nullable=False, default="USER")
+    # Bumped when a booking of the user is written, see booking_versions
+    bookings_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     bookings = db.relationship('Booking', backref=db.backref('user', lazy=True))
 
+    # Usernames and emails are unique regardless of case on every database
+    __table_args__ = (
+        db.Index('ix_users_username_lower', func.lower(username), unique=True),
+        db.Index('ix_users_email_lower', func.lower(email), unique=True),
+    )
+
     def __eq__(self, other):
         return other is not None and self.id == other.id
 
@@ -47,6 +60,25 @@ class User(db.Model, UserMixin):
 class Booking(db.Model):
     __tablename__ = 'bookings'
     id = db.Column(db.Integer, primary_key=True)
+    # Old values are loaded when these are set, slot_occupancy takes them off the slots the booking occupied
+    number = column_property(db.Column(db.Integer, default=1), active_history=True)
+    start = column_property(db.Column(db.DateTime, nullable=False), active_history=True)
+    end = column_property(db.Column(db.DateTime, nullable=False), active_history=True)
+
+    note = db.Column(db.String, nullable=True)
+
+    user_id = db.Column(db.Integer(), db.ForeignKey('users.id'))
+    zone_id = column_property(db.Column(db.Integer(), db.ForeignKey('zones.id'), nullable=False), active_history=True)
+
+    __table_args__ = (
+        db.Index('ix_bookings_zone_id_start_end', 'zone_id', 'start', 'end'),
+        db.Index('ix_bookings_user_id_end', 'user_id', 'end'),
+    )
+
+
+class BookingArchive(db.Model):
+    __tablename__ = 'bookings_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
     number = db.Column(db.Integer, default=1)
     start = db.Column(db.DateTime, nullable=False)
     end = db.Column(db.DateTime, nullable=False)
@@ -54,7 +86,11 @@ class Booking(db.Model):
     note = db.Column(db.String, nullable=True)
 
     user_id = db.Column(db.Integer(), db.ForeignKey('users.id'))
-    zone_id = db.Column(db.Integer(), db.ForeignKey('zones.id'), nullable=False)
+    zone_id = db.Column(db.Integer(), db.ForeignKey('zones.id', ondelete='CASCADE'), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_bookings_archive_user_id_end', 'user_id', 'end'),
+    )
 
 
 class GymBooking(db.Model):
@@ -71,6 +107,10 @@ class GymBooking(db.Model):
 
     zone_id = db.Column(db.Integer(), db.ForeignKey('zones.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_gym_bookings_zone_id_start_repeat_end', 'zone_id', 'start', 'repeat_end'),
+    )
+
 
 class Gym(db.Model):
     __tablename__ = 'gyms'
@@ -85,18 +125,28 @@ class Gym(db.Model):
     max_number_per_booking = db.Column(db.Integer, nullable=False, default=1) # Number of persons per booking
     max_days_ahead = db.Column(db.Integer, nullable=True, default=7)
     book_before = db.Column(db.Integer, nullable=False, default=0)
+    # Bumped when the settings or zones change, main page layouts are cached per version
+    settings_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped when a repeating booking in the gym is written, see booking_versions
+    bookings_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
-    admins = db.relationship('User', secondary=gym_admins, lazy='subquery',
+    # Only loaded when used, checks go through utils.has_gym_role
+    admins = db.relationship('User', secondary=gym_admins, lazy=True,
                              backref=db.backref('admin_gyms', lazy=True))
 
-    instructors = db.relationship('User', secondary=gym_instructors, lazy='subquery',
+    instructors = db.relationship('User', secondary=gym_instructors, lazy=True,
                                   backref=db.backref('instructor_gyms', lazy=True))
 
-    users = db.relationship('User', secondary=gym_memberships, lazy='subquery',
-                             backref=db.backref('gyms', lazy=True))
+    users = db.relationship('User', secondary=gym_memberships, lazy=True,
+                            backref=db.backref('gyms', lazy=True))
 
     zones = db.relationship('Zone', backref=db.backref('gym', lazy=True))
 
+    # Gyms are listed and searched by name on the superadmin page
+    __table_args__ = (
+        db.Index('ix_gyms_name_lower', func.lower(name), id),
+    )
+
     def get_max_people(self, zone_id):
         try:
             r = next(x for x in self.zones if x.id == zone_id).max_people
@@ -118,12 +168,36 @@ class Zone(db.Model):
     repeating_bookings = db.relationship('GymBooking', backref=db.backref('zone', lazy=True))
 
 
+class ZoneSlotOccupancy(db.Model):
+    __tablename__ = 'zone_slot_occupancy'
+    zone_id = db.Column(db.Integer(), db.ForeignKey('zones.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class OccupancyChange(db.Model):
+    """Log of occupancy changes, read by every worker to push them to open heatmaps. A null delta means reload."""
+    __tablename__ = 'occupancy_changes'
+    id = db.Column(db.Integer, primary_key=True)
+    zone_id = db.Column(db.Integer(), db.ForeignKey('zones.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=True)
+    first_slot = db.Column(db.Integer, nullable=True)
+    last_slot = db.Column(db.Integer, nullable=True)
+    delta = db.Column(db.Integer, nullable=True)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_occupancy_changes_zone_id_id', 'zone_id', 'id'),
+    )
+
+
 def init_db(fapp, user_manager):
 
     db.init_app(fapp)
 
     with fapp.app_context():
-        if not os.path.exists(DB_PATH):
+        if not inspect(db.engine).has_table(User.__tablename__):
             print("Initializing database")
             db.create_all()
             stamp()
@@ -0,0 +1,173 @@
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from threading import Lock
+from time import monotonic
+
+import numpy as np
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOT = timedelta(minutes=SLOT_MINUTES)
+
+
+def slot_indices(times, origin):
+    """Slot index of every datetime in `times`, counted from midnight of `origin`."""
+    origin = datetime(origin.year, origin.month, origin.day)
+    return np.fromiter(((t - origin) // SLOT for t in times), dtype=np.int64, count=len(times))
+
+
+def occupancy(start_slots, end_slots, numbers, slots):
+    """
+    Number of persons in each of `slots` timeslots, given bookings covering [start, end).
+
+    All bookings are added in one pass using a difference array, so the cost is linear in
+    the number of bookings plus the number of slots. Bookings partly outside the window are clipped.
+    """
+    start_slots = np.clip(np.asarray(start_slots, dtype=np.int64), 0, slots)
+    end_slots = np.clip(np.asarray(end_slots, dtype=np.int64), 0, slots)
+    numbers = np.asarray(numbers, dtype=np.float64)
+
+    diff = np.bincount(start_slots, weights=numbers, minlength=slots + 1)
+    diff -= np.bincount(end_slots, weights=numbers, minlength=slots + 1)
+    return np.cumsum(diff[:slots])
+
+
+def booking_occupancy(rows, origin, days):
+    """Occupancy map of `days` days from `origin` for rows of (start, end, number)."""
+    slots = SLOTS_PER_DAY * days
+    if not rows:
+        return np.zeros(slots)
+
+    starts, ends, numbers = zip(*rows)
+    numbers = [1 if n is None else n for n in numbers]
+    return occupancy(slot_indices(starts, origin), slot_indices(ends, origin), numbers, slots)
+
+
+class OccupancyCache:
+    """
+    Bounded LRU cache of occupancy arrays keyed by (zone_id, week_start).
+
+    Every zone carries a version number which is bumped by `invalidate`. Entries built for an older
+    version are treated as misses, so a map built while a booking was being written is never served.
+    Entries also expire after `ttl` seconds, which bounds staleness across processes.
+    """
+
+    def __init__(self, maxsize=256, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._versions = defaultdict(int)
+        self._lock = Lock()
+
+    def get(self, zone_id, week_start, build):
+        key = (zone_id, week_start)
+        version = self._versions[zone_id]
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version and entry[1] > monotonic():
+            self.hits += 1
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return entry[2]
+
+        self.misses += 1
+        value = build()
+        value.flags.writeable = False
+
+        with self._lock:
+            self._entries[key] = (version, monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *zone_ids):
+        with self._lock:
+            for zone_id in zone_ids:
+                self._versions[zone_id] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def version(self, zone_id):
+        return self._versions[zone_id]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+REPEAT_PERIODS = {"d": 1, "w": 7, "bw": 14}
+REPEAT_MONTHLY = "m"
+
+
+def periodic_days(first, last, period):
+    """
+    Occurrences of bookings repeating every `period` days, first held `first` days after the window start and
+    repeating until day `last`. Returns the owning booking and the day offset of every occurrence.
+    """
+    first = np.asarray(first, dtype=np.int64)
+    last = np.asarray(last, dtype=np.int64)
+    period = np.asarray(period, dtype=np.int64)
+
+    start = first + np.maximum(0, -(first // period)) * period
+    count = np.maximum(0, (last - start) // period + 1)
+    owner = np.repeat(np.arange(count.size), count)
+    k = np.arange(owner.size) - np.repeat(np.cumsum(count) - count, count)
+    return owner, start[owner] + k * period[owner]
+
+
+def monthly_days(first, last, day_of_month, origin, days):
+    """
+    Occurrences of bookings repeating on the same day every month, skipping months that are too short.
+    Returns the owning booking and the day offset from `origin` of every occurrence.
+    """
+    first = np.asarray(first, dtype=np.int64)
+    last = np.asarray(last, dtype=np.int64)
+    day_of_month = np.asarray(day_of_month, dtype=np.int64)
+
+    origin = np.datetime64(origin.date(), "D")
+    months = np.arange(origin.astype("datetime64[M]"), (origin + days).astype("datetime64[M]") + 1)
+    dates = months.astype("datetime64[D]")[None, :] + (day_of_month[:, None] - 1)
+    offsets = (dates - origin).astype(np.int64)
+
+    valid = (dates.astype("datetime64[M]") == months[None, :]) & \
+            (offsets >= np.maximum(first, 0)[:, None]) & (offsets <= last[:, None])
+    owner, month = np.nonzero(valid)
+    return owner, offsets[owner, month]
+
+
+def repeating_occupancy(rows, origin, days):
+    """
+    Occupancy map of `days` days from `origin` for repeating bookings given as rows of
+    (start, end, number, repeat, repeat_end). Every occurrence inside the window is added in one step.
+    """
+    slots = SLOTS_PER_DAY * days
+    origin = datetime(origin.year, origin.month, origin.day)
+
+    first, last, start_slot, length, numbers = [], [], [], [], []
+    for start, end, number, repeat, repeat_end in rows:
+        day = datetime(start.year, start.month, start.day)
+        first.append((day - origin).days)
+        last.append(days - 1 if repeat_end is None else min(days - 1, (repeat_end - origin).days))
+        start_slot.append((start - day) // SLOT)
+        length.append((end - day) // SLOT - (start - day) // SLOT)
+        numbers.append(1 if number is None else number)
+
+    repeats = [x[3] for x in rows]
+    periodic = [i for i, r in enumerate(repeats) if r in REPEAT_PERIODS]
+    monthly = [i for i, r in enumerate(repeats) if r == REPEAT_MONTHLY]
+
+    first, last = np.asarray(first, dtype=np.int64), np.asarray(last, dtype=np.int64)
+    owner_p, day_p = periodic_days(first[periodic], last[periodic], [REPEAT_PERIODS[repeats[i]] for i in periodic])
+    owner_m, day_m = monthly_days(first[monthly], last[monthly], [rows[i][0].day for i in monthly], origin, days)
+
+    owner = np.concatenate([np.asarray(periodic, dtype=np.int64)[owner_p], np.asarray(monthly, dtype=np.int64)[owner_m]])
+    day = np.concatenate([day_p, day_m])
+
+    start_slots = day * SLOTS_PER_DAY + np.asarray(start_slot, dtype=np.int64)[owner]
+    end_slots = start_slots + np.asarray(length, dtype=np.int64)[owner]
+    return occupancy(start_slots, end_slots, np.asarray(numbers, dtype=np.float64)[owner], slots)
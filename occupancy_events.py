@@ -0,0 +1,364 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from flask import Response, abort, request
+from flask_user import login_required, allow_unconfirmed_email
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import Session
+
+import config
+from models import db, GymBooking, OccupancyChange, Zone
+from slot_occupancy import day_ranges, flush_listeners
+
+broker = None
+source = None
+
+
+class Subscription:
+    """
+    Pending events of one connected client.
+
+    At most `size` events are kept. When more arrive before the client has read them, they are all replaced by
+    one reload event, so memory per client is bounded however busy the zone is.
+    """
+
+    def __init__(self, zone_id, size):
+        self.zone_id = zone_id
+        self.size = size
+        self.events = deque()
+        self.overflowed = False
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+
+    def put(self, e):
+        with self.lock:
+            if len(self.events) >= self.size:
+                self.events.clear()
+                self.overflowed = True
+            elif not self.overflowed:
+                self.events.append(e)
+        self.ready.set()
+
+    def get(self, timeout):
+        self.ready.wait(timeout)
+        with self.lock:
+            self.ready.clear()
+            if self.overflowed:
+                self.overflowed = False
+                return [reload_event(self.zone_id)]
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+
+class Broker:
+    """Fans occupancy events out to the subscriptions of this process."""
+
+    def __init__(self, max_clients, buffer_size):
+        self.max_clients = max_clients
+        self.buffer_size = buffer_size
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, zone_id):
+        with self.lock:
+            if len(self.subscriptions) >= self.max_clients:
+                return None
+            subscription = Subscription(zone_id, self.buffer_size)
+            self.subscriptions.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, events):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for e in events:
+            for subscription in subscriptions:
+                if subscription.zone_id == e["zone"]:
+                    subscription.put(e)
+
+
+def reload_event(zone_id, _id=None):
+    return {"id": _id, "zone": zone_id, "reload": True}
+
+
+def delta_event(zone_id, day, first, last, delta, _id=None):
+    return {"id": _id, "zone": zone_id, "day": day.strftime("%Y-%m-%d"), "first": first, "last": last, "delta": delta}
+
+
+def as_event(change):
+    if change.delta is None:
+        return reload_event(change.zone_id, change.id)
+    return delta_event(change.zone_id, change.day, change.first_slot, change.last_slot, change.delta, change.id)
+
+
+REPEATING_TRACKED = ["zone_id", "zone", "start", "end", "number", "repeat", "repeat_end"]
+
+
+def _repeating_zone_ids(objects, dirty=False):
+    zone_ids = set()
+    for b in objects:
+        if isinstance(b, GymBooking):
+            state = inspect(b)
+            if dirty and not any(state.attrs[k].history.has_changes() for k in REPEATING_TRACKED):
+                continue
+            zone_ids.update(x for x in state.attrs.zone_id.history.sum() if x is not None)
+            if b.zone is not None:
+                zone_ids.add(b.zone.id)
+    return zone_ids
+
+
+def _before_flush(session, flush_context, instances):
+    # Zones of deleted and moved repeating bookings have to be read before the flush
+    changed = _repeating_zone_ids(session.deleted) | _repeating_zone_ids(session.dirty, dirty=True)
+    session.info.setdefault("occupancy_reloads", set()).update(changed)
+
+
+def flushed_events(session, deltas):
+    """Events for the slot deltas applied by slot_occupancy in a flush and for changed repeating bookings."""
+    # Zones deleted in this flush take their bookings along, and there is nobody left to tell about them
+    deleted = {x.id for x in session.deleted if isinstance(x, Zone)}
+    events = []
+    for zone_id, start, end, number in deltas:
+        if zone_id not in deleted:
+            events += [delta_event(zone_id, day, first, last, number) for day, first, last in day_ranges(start, end)]
+
+    reloads = session.info.pop("occupancy_reloads", set())
+    reloads |= _repeating_zone_ids(session.new)
+    events += [reload_event(zone_id) for zone_id in reloads - deleted if zone_id is not None]
+    return events
+
+
+class LocalEventSource:
+    """
+    Publishes changes straight to the broker of this process once they are committed.
+
+    Only suitable for a single process, but needs no polling, which makes it handy for tests and development.
+    """
+
+    def __init__(self):
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    def start(self, fapp):
+        event.listen(Session, "before_flush", _before_flush)
+        flush_listeners.append(self._after_flush)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_soft_rollback", self._after_rollback)
+
+    def _after_flush(self, session, deltas):
+        session.info.setdefault("occupancy_events", []).extend(flushed_events(session, deltas))
+
+    def _after_commit(self, session):
+        events = session.info.pop("occupancy_events", [])
+        if events:
+            with self.lock:
+                for e in events:
+                    self.last_id += 1
+                    e["id"] = self.last_id
+            broker.publish(events)
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop("occupancy_events", None)
+
+    def latest_change(self, zone_id):
+        return self.last_id
+
+    def replay(self, zone_id, after_id):
+        return []
+
+
+class DatabaseEventSource:
+    """
+    Writes changes to occupancy_changes in the same transaction, and polls that table from a thread in every
+    worker. This also invalidates the occupancy cache of the other workers.
+    """
+
+    def __init__(self):
+        self.last_id = None
+        # Ids below last_id that were not committed yet when last_id was read, and when they were skipped
+        self.skipped = {}
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self, fapp):
+        event.listen(Session, "before_flush", _before_flush)
+        flush_listeners.append(self._after_flush)
+
+        @fapp.before_request
+        def start_occupancy_poller():
+            # Started from a request, so every forked worker gets its own thread
+            if self.thread is None:
+                with self.lock:
+                    if self.thread is None:
+                        self.thread = threading.Thread(target=self._poll, args=(fapp,), daemon=True)
+                        self.thread.start()
+
+    def _after_flush(self, session, deltas):
+        events = flushed_events(session, deltas)
+        if events:
+            now = datetime.now()
+            session.connection().execute(OccupancyChange.__table__.insert(), [
+                dict(zone_id=e["zone"], day=datetime.strptime(e["day"], "%Y-%m-%d").date() if "day" in e else None,
+                     first_slot=e.get("first"), last_slot=e.get("last"), delta=e.get("delta"), created=now)
+                for e in events
+            ])
+
+    def _poll(self, fapp):
+        from booking_logic import occupancy_cache
+
+        with fapp.app_context():
+            self.last_id = db.session.query(db.func.max(OccupancyChange.id)).scalar() or 0
+            db.session.remove()
+            next_prune = time.monotonic()
+            while True:
+                time.sleep(config.OCCUPANCY_EVENTS_POLL)
+                try:
+                    events = self._read_changes()
+                    if events:
+                        occupancy_cache.invalidate(*{e["zone"] for e in events})
+                        broker.publish(events)
+
+                    if time.monotonic() > next_prune:
+                        next_prune = time.monotonic() + config.OCCUPANCY_EVENTS_RETENTION / 10
+                        cutoff = datetime.now() - timedelta(seconds=config.OCCUPANCY_EVENTS_RETENTION)
+                        OccupancyChange.query.filter(OccupancyChange.created < cutoff).delete()
+                        db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    import traceback
+                    traceback.print_exc()
+                finally:
+                    db.session.remove()
+
+    def _read_changes(self):
+        """
+        Changes committed since the last call, as events. Changes that committed after changes with higher ids did
+        are read as well, for OCCUPANCY_EVENTS_POLL_LAG seconds, and become reload events.
+        """
+        now = time.monotonic()
+        self.skipped = {k: v for k, v in self.skipped.items() if now - v < config.OCCUPANCY_EVENTS_POLL_LAG}
+
+        new = OccupancyChange.id > self.last_id
+        changes = OccupancyChange.query\
+            .filter(or_(new, OccupancyChange.id.in_(list(self.skipped))) if self.skipped else new)\
+            .order_by(OccupancyChange.id)\
+            .limit(1000)\
+            .all()
+
+        late = [x for x in changes if x.id < self.last_id]
+        changes = changes[len(late):]
+        for x in late:
+            del self.skipped[x.id]
+        if changes:
+            ids = {x.id for x in changes}
+            self.skipped.update((x, now) for x in range(self.last_id + 1, changes[-1].id) if x not in ids)
+            self.last_id = changes[-1].id
+
+        # Clients skip ids below the ones they have applied, so they reload instead
+        return [reload_event(zone_id) for zone_id in {x.zone_id for x in late}] + [as_event(x) for x in changes]
+
+    def latest_change(self, zone_id):
+        from booking_logic import occupancy_cache
+
+        latest = db.session.query(db.func.max(OccupancyChange.id)).filter(OccupancyChange.zone_id == zone_id).scalar()
+        # Changes made by other workers may not have invalidated the cache of this one yet
+        if latest is not None and (self.last_id is None or latest > self.last_id):
+            occupancy_cache.invalidate(zone_id)
+        return latest or 0
+
+    def replay(self, zone_id, after_id):
+        """Changes of zone_id after after_id, or None when they can't be replayed and the heatmap has to reload."""
+        # Changes below after_id may have committed after the client got after_id, see _read_changes
+        recent = datetime.now() - timedelta(seconds=config.OCCUPANCY_EVENTS_POLL_LAG)
+        late = OccupancyChange.query\
+            .filter(OccupancyChange.zone_id == zone_id)\
+            .filter(OccupancyChange.id < after_id)\
+            .filter(OccupancyChange.created >= recent)
+        if db.session.query(late.exists()).scalar():
+            return None
+
+        changes = OccupancyChange.query\
+            .filter(OccupancyChange.zone_id == zone_id)\
+            .filter(OccupancyChange.id > after_id)\
+            .order_by(OccupancyChange.id)\
+            .limit(config.OCCUPANCY_EVENTS_BUFFER + 1)\
+            .all()
+        if len(changes) > config.OCCUPANCY_EVENTS_BUFFER:
+            return None
+        return [as_event(x) for x in changes]
+
+
+def format_events(events):
+    return "".join(
+        (f"id: {e['id']}\n" if e["id"] is not None else "") + f"data: {json.dumps(e)}\n\n" for e in events
+    )
+
+
+def stream(subscription, initial):
+    try:
+        yield f"retry: {config.OCCUPANCY_EVENTS_RETRY}\n\n" + format_events(initial)
+        # Streams end after a while and browsers reconnect, which spreads them over the workers again
+        until = time.monotonic() + config.OCCUPANCY_EVENTS_STREAM_SECONDS
+        while time.monotonic() < until:
+            events = subscription.get(config.OCCUPANCY_EVENTS_KEEPALIVE)
+            yield format_events(events) if events else ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def occupancy_events(zone_id):
+    from utils import get_zones
+
+    if zone_id not in get_zones():
+        abort(404)
+
+    subscription = broker.subscribe(zone_id)
+    if subscription is None:
+        # Browsers give up on a refused stream, the heatmap asks again later, see RETRY_MIN_MS in script.js
+        abort(Response(status=503, headers={"Retry-After": "15"}))
+
+    # Browsers send Last-Event-ID when reconnecting, a new connection asks for the changes after its heatmap data.
+    # Replayed events may also arrive through the subscription, clients skip ids they have already applied.
+    initial = []
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("after", "")
+    try:
+        if last_id.isdigit():
+            initial = source.replay(zone_id, int(last_id))
+            if initial is None:
+                initial = [reload_event(zone_id)]
+    except Exception:
+        broker.unsubscribe(subscription)
+        raise
+    finally:
+        db.session.remove()
+
+    return Response(stream(subscription, initial), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def latest_change(zone_id):
+    """Id of the latest change of zone_id, to be read before its occupancy is, or None when events are off."""
+    if source is None:
+        return None
+    return source.latest_change(zone_id)
+
+
+def init_occupancy_events(fapp):
+    """Push occupancy changes to open heatmaps as Server-Sent Events on /occupancy/events/<zone id>."""
+    global broker, source
+
+    if config.OCCUPANCY_EVENTS == "off":
+        return
+
+    broker = Broker(config.OCCUPANCY_EVENTS_MAX_CLIENTS, config.OCCUPANCY_EVENTS_BUFFER)
+    source = LocalEventSource() if config.OCCUPANCY_EVENTS == "local" else DatabaseEventSource()
+    source.start(fapp)
+    fapp.add_url_rule("/occupancy/events/<int:zone_id>", "occupancy_events",
+                      allow_unconfirmed_email(login_required(occupancy_events)))
@@ -1,24 +1,121 @@
+from datetime import datetime
+
 import dash_core_components as dcc
+import dash_html_components as html
 import dash_bootstrap_components as dbc
 from dash.dependencies import State
 from dash.exceptions import PreventUpdate
 from dash_extensions.snippets import get_triggered
+from flask_login import current_user
+from sqlalchemy import and_, func, or_
 
+import config
 from app import app
-from models import Gym, User, db
+from models import Booking, Gym, User, Zone, db, gym_memberships
 from dash_extensions.enrich import Output, Input, Trigger
+from utils import starts_with
+
+
+def search_users(prefix, limit):
+    """Users whose username starts with prefix, as (id, username) ordered by name."""
+    username = func.lower(User.username)
+    return db.session.query(User.id, User.username)\
+        .filter(*starts_with(username, prefix))\
+        .order_by(username).limit(limit).all()
+
+
+def gym_page(search=None, after=None, before=None, limit=config.ADMIN_PAGE_SIZE):
+    """
+    Gyms ordered by name, as (id, name, code, key), and whether there are more in that direction.
+
+    Pages are keyset paginated on (lower(name), id), the first and last entry of a page are the keys of its neighbours.
+    """
+    name = func.lower(Gym.name)
+    q = db.session.query(Gym.id, Gym.name, Gym.code, name.label("key"))
+    if search:
+        q = q.filter(*starts_with(name, search))
+    if after:
+        q = q.filter(or_(name > after[0], and_(name == after[0], Gym.id > after[1]))).order_by(name, Gym.id)
+    elif before:
+        q = q.filter(or_(name < before[0], and_(name == before[0], Gym.id < before[1])))\
+            .order_by(name.desc(), Gym.id.desc())
+    else:
+        q = q.order_by(name, Gym.id)
+
+    rows = q.limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+    return rows, more
+
+
+def gym_counts(gym_ids):
+    """Members and future bookings per gym, as two dicts from gym id to count."""
+    if not gym_ids:
+        return {}, {}
+    members = db.session.query(gym_memberships.c.gym, func.count())\
+        .filter(gym_memberships.c.gym.in_(gym_ids))\
+        .group_by(gym_memberships.c.gym)
+    bookings = db.session.query(Zone.gym_id, func.count(Booking.id))\
+        .join(Booking, Booking.zone_id == Zone.id)\
+        .filter(Zone.gym_id.in_(gym_ids), Booking.start >= datetime.now())\
+        .group_by(Zone.gym_id)
+    return dict(members.all()), dict(bookings.all())
+
+
+def gyms_by_id(ids):
+    """The gyms with the given ids, in one query."""
+    if not ids:
+        return []
+    return Gym.query.filter(Gym.id.in_(ids)).all()
+
+
+def page_key(row):
+    return [row.key, row.id]
 
 
 @app.callback(
-    Output("gym-admin-dropdown", "value"),
-    Input("user-admin-dropdown", "value")
+    Output("user-admin-dropdown", "options"),
+    Input("user-admin-dropdown", "search_value"),
+    [State("user-admin-dropdown", "value")]
+)
+def on_user_search(search, user):
+    if not search or current_user.role != "ADMIN":
+        raise PreventUpdate
+
+    options = [{"label": name, "value": _id} for _id, name in search_users(search, config.USER_SEARCH_LIMIT)]
+    u = User.query.get(user) if user else None
+    if u and u.id not in [x["value"] for x in options]:
+        options.insert(0, {"label": u.username, "value": u.id})
+    return options
+
+
+@app.callback(
+    [Output("gym-admin-dropdown", "value"), Output("gym-admin-dropdown", "options")],
+    Input("user-admin-dropdown", "value"), group="admin-gyms"
 )
 def on_user(user):
     u = User.query.filter_by(id=user).first()
 
     if u:
-        return [x.id for x in u.gyms]
-    return None
+        return [x.id for x in u.gyms], [{"label": x.name, "value": x.id} for x in u.gyms]
+    return None, []
+
+
+@app.callback(
+    Output("gym-admin-dropdown", "options"),
+    Input("gym-admin-dropdown", "search_value"),
+    [State("gym-admin-dropdown", "value")], group="admin-gyms"
+)
+def on_gym_search(search, gyms):
+    if not search or current_user.role != "ADMIN":
+        raise PreventUpdate
+
+    gyms = gyms or []
+    options = [{"label": x.name, "value": x.id} for x in gyms_by_id(gyms)]
+    rows, _ = gym_page(search, limit=config.USER_SEARCH_LIMIT)
+    return options + [{"label": x.name, "value": x.id} for x in rows if x.id not in gyms]
 
 
 @app.callback(
@@ -33,9 +130,8 @@ def on_admin_change(gyms, user):
         raise PreventUpdate
     try:
         u = User.query.filter_by(id=user).first()
-        gyms = [Gym.query.filter_by(id=_x).first() for _x in gyms] if gyms else []
 
-        u.gyms = gyms
+        u.gyms = gyms_by_id(gyms)
         db.session.add(u)
         db.session.commit()
 
@@ -44,21 +140,68 @@ def on_admin_change(gyms, user):
         return str(e)
 
 
+@app.callback(
+    [Output("admin-gym-table", "children"), Output("admin-gym-page", "data"),
+     Output("admin-gym-prev", "disabled"), Output("admin-gym-next", "disabled")],
+    [Input("admin-gym-search", "value"), Trigger("admin-gym-prev", "n_clicks"), Trigger("admin-gym-next", "n_clicks")],
+    [State("admin-gym-page", "data")]
+)
+def on_gym_page(search, page):
+    if current_user.role != "ADMIN":
+        raise PreventUpdate
+
+    trig = get_triggered()
+    if trig.id == "admin-gym-next" and page:
+        rows, more = gym_page(search, after=page["last"])
+        has_prev, has_next = True, more
+    elif trig.id == "admin-gym-prev" and page:
+        rows, more = gym_page(search, before=page["first"])
+        has_prev, has_next = more, True
+    else:
+        rows, more = gym_page(search)
+        has_prev, has_next = False, more
+
+    if not rows:
+        return [html.Tr(html.Td("No gyms", colSpan=4))], None, True, True
+
+    members, bookings = gym_counts([x.id for x in rows])
+    table = [
+        html.Tr([html.Td(x.name), html.Td(x.code), html.Td(members.get(x.id, 0)), html.Td(bookings.get(x.id, 0))])
+        for x in rows
+    ]
+    return table, {"first": page_key(rows[0]), "last": page_key(rows[-1])}, not has_prev, not has_next
+
+
 def create_admin_layout():
     return dbc.Container([
         dbc.Row([
             dbc.Col([
                 dcc.Dropdown(
                     id="user-admin-dropdown",
-                    options=[{"label": x.username, "value": x.id} for x in User.query.all()]
+                    options=[],
+                    placeholder="Type to search users"
                 ),
                 dcc.Dropdown(
                     id="gym-admin-dropdown",
-                    options=[{"label": x.name, "value": x.id} for x in Gym.query.all()],
+                    options=[],
+                    placeholder="Type to search gyms",
                     multi=True,
                 ),
                 dbc.Alert(id="on-admin-change"),
                 dbc.Button("Save", id="save-admin-change")
-            ], width=4)
+            ], width=4),
+            dbc.Col([
+                dbc.Input(id="admin-gym-search", type="search", placeholder="Search gyms", debounce=True),
+                dbc.Table([
+                    html.Thead(html.Tr([html.Th("Name"), html.Th("Code"), html.Th("Members"),
+                                        html.Th("Future bookings")])),
+                    html.Tbody(id="admin-gym-table")
+                ], size="sm"),
+                dcc.Store(id="admin-gym-page"),
+                dbc.Row([
+                    dbc.Button("Previous", id="admin-gym-prev", color="primary", disabled=True),
+                    dbc.Button("Next", id="admin-gym-next", color="primary", disabled=True),
+                ], justify="between", className="px-3"),
+            ], width=6)
         ], justify="around")
     ], fluid=True)
@@ -2,16 +2,21 @@ from collections import defaultdict
 from datetime import datetime
 from typing import Union
 
+import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 from dash.dependencies import ALL
-from dash_extensions.enrich import Output, State, Trigger
+from dash_extensions.enrich import Output, Input, State, Trigger
 from dash.exceptions import PreventUpdate
 from dash_extensions.snippets import get_triggered
 from flask_login import current_user
+from sqlalchemy.orm import contains_eager, joinedload
 
+import config
 from app import app
-from models import Booking, db, GymBooking
+from booking_logic import occupancy_cache
+from models import Booking, db, GymBooking, Zone
+from time_utils import parse
 from utils import get_chosen_gym, is_admin, is_instructor
 
 
@@ -22,10 +27,23 @@ BOOKING_TYPES = {
 
 
 REPEAT_DESCRIPTION = {
-    "w": "Weekly"
+    "d": "Daily",
+    "w": "Weekly",
+    "bw": "Biweekly",
+    "m": "Monthly"
 }
 
 
+def repeat_label(b: GymBooking):
+    if b.repeat == "w":
+        return b.start.strftime("%A")
+    if b.repeat == "bw":
+        return b.start.strftime("Every other %A")
+    if b.repeat == "m":
+        return f"Monthly on day {b.start.day}"
+    return REPEAT_DESCRIPTION.get(b.repeat, b.repeat)
+
+
 def create_single_booking(b: Union[Booking, GymBooking]):
     result = []
     result.append(html.Div([
@@ -87,6 +105,24 @@ def create_single_booking(b: Union[Booking, GymBooking]):
     return html.Div(result)
 
 
+def upcoming_bookings(user_id, limit, now=None):
+    """
+    The first `limit` bookings of user_id which have not ended, and whether there are more.
+
+    Ordered by end, so ix_bookings_user_id_end serves the query without touching past bookings. Zones are joined
+    in, create_single_booking shows their names.
+    """
+    bookings = Booking.query.options(joinedload(Booking.zone))\
+        .filter(Booking.user_id == user_id, Booking.end >= (now or datetime.now()))\
+        .order_by(Booking.end, Booking.id).limit(limit + 1).all()
+    return bookings[:limit], len(bookings) > limit
+
+
+def gym_repeating_bookings(gym_id):
+    return GymBooking.query.join(GymBooking.zone).options(contains_eager(GymBooking.zone))\
+        .filter(Zone.gym_id == gym_id).all()
+
+
 def create_bookings(bookings):
     k = defaultdict(list)
     result = []
@@ -97,7 +133,7 @@ def create_bookings(bookings):
                     k[x.start.date()].append(x)
         else:
             for x in bookings:
-                k[x.start.strftime("%A")].append(x)
+                k[repeat_label(x)].append(x)
 
         for d in sorted(k.keys()):
             result.append(
@@ -156,9 +192,11 @@ def on_delete():
     if trig.id is not None and trig.n_clicks is not None:
         if trig.id["type"] == "delete-booking":
             try:
-                db.session.delete(
-                    db.session.query(BOOKING_TYPES[trig.id["bookingtype"]]).filter_by(id=trig.id["bookingid"]).first())
+                booking = db.session.query(BOOKING_TYPES[trig.id["bookingtype"]]).filter_by(id=trig.id["bookingid"]).first()
+                zone_id = booking.zone_id
+                db.session.delete(booking)
                 db.session.commit()
+                occupancy_cache.invalidate(zone_id)
                 return {"deleted": trig.id["bookingid"]}
             except Exception as e:
                 import traceback
@@ -173,24 +211,52 @@ def on_delete():
     raise PreventUpdate
 
 
+def is_shown(shown, version):
+    """Whether the client already shows this version of a list, and none of its bookings has ended since."""
+    return shown is not None and shown["version"] == version and \
+        (shown["expires"] is None or datetime.now() < parse(shown["expires"]))
+
+
 @app.callback(
-    Output("my-bookings", "children"),
-    [Trigger("data-store", "data"), Trigger("bookings_store", "data"), Trigger("edit-booking-modal", "is_open")]
+    [Output("my-bookings", "children"), Output("my-bookings-more", "style"), Output("my-bookings-shown", "data")],
+    [Trigger("data-store", "data"), Trigger("bookings_store", "data"), Trigger("edit-booking-modal", "is_open"),
+     Input("my-bookings-more", "n_clicks")],
+    [State("my-bookings-shown", "data")]
      )
-def redraw_all_user():
-    return create_bookings(current_user.bookings)
+def redraw_all_user(more_clicks, shown):
+    # Every "Load more" shows another page, the list is redrawn from the start
+    limit = config.MY_BOOKINGS_PAGE_SIZE * ((more_clicks or 0) + 1)
+    version = [current_user.id, current_user.bookings_version, get_chosen_gym().settings_version,
+               is_admin() or is_instructor(), limit]
+    if is_shown(shown, version):
+        raise PreventUpdate
+
+    bookings, more = upcoming_bookings(current_user.id, limit)
+    # Ordered by end, the first booking is the first to leave the list
+    expires = bookings[0].end.isoformat(timespec="seconds") if bookings else None
+    return create_bookings(bookings), None if more else {"display": "none"}, dict(version=version, expires=expires)
 
 
 @app.callback(
-    Output("gym-bookings", "children"),
-    [Trigger("data-store", "data"), Trigger("bookings_store", "data"), Trigger("edit-booking-modal", "is_open")]
+    [Output("gym-bookings", "children"), Output("gym-bookings-shown", "data")],
+    [Trigger("data-store", "data"), Trigger("bookings_store", "data"), Trigger("edit-booking-modal", "is_open")],
+    [State("gym-bookings-shown", "data")]
 )
-def redraw_all_repeating():
-    bookings = []
-    for z in get_chosen_gym().zones:
-        bookings += z.repeating_bookings
-    return create_bookings(bookings)
+def redraw_all_repeating(shown):
+    gym = get_chosen_gym()
+    version = [gym.id, gym.bookings_version, gym.settings_version, is_admin() or is_instructor()]
+    if is_shown(shown, version):
+        raise PreventUpdate
+
+    return create_bookings(gym_repeating_bookings(gym.id)), dict(version=version, expires=None)
 
 
-my_bookings_list = html.Div(id="my-bookings")
-gym_bookings_list = html.Div(id="gym-bookings")
+my_bookings_list = html.Div([
+    html.Div(id="my-bookings"),
+    dbc.Button("Load more", id="my-bookings-more", color="link", size="sm", style={"display": "none"}),
+    dcc.Store(id="my-bookings-shown"),
+])
+gym_bookings_list = html.Div([
+    html.Div(id="gym-bookings"),
+    dcc.Store(id="gym-bookings-shown"),
+])
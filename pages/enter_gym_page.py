@@ -9,6 +9,7 @@ from app import app
 from dash_extensions.enrich import Output, Input, State
 
 from models import db, Gym
+from utils import is_member
 
 
 @app.callback(
@@ -34,8 +35,9 @@ def on_new_gym(n, gym_code):
     if gym_code is not None:
         g = db.session.query(Gym).filter_by(code=gym_code).first()
         if g:
-            current_user.gyms.append(g)
-            db.session.commit()
+            if not is_member(current_user.id, g.id):
+                current_user.gyms.append(g)
+                db.session.commit()
             return "OK", False
 
     return "Gym not found", n is not None
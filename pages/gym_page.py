@@ -7,12 +7,63 @@ from dash.dependencies import State, ALL, Input
 from dash.exceptions import PreventUpdate
 from dash_extensions.enrich import Trigger, Output
 from dash_extensions.snippets import get_triggered
+from sqlalchemy import exists, func
 
+import config
 from app import app
-from models import db, User, Zone, Booking
+from booking_logic import occupancy_cache
+from models import db, User, Zone, Booking, Gym, gym_memberships
 from pages.bookings_list import gym_bookings_list
 from time_utils import as_datetime
-from utils import get_chosen_gym, get_zone
+from utils import get_chosen_gym, get_zone, clear_request_cache, is_admin, starts_with
+
+
+def users_by_id(ids):
+    """The users with the given ids, in one query."""
+    if not ids:
+        return []
+    return User.query.filter(User.id.in_(ids)).all()
+
+
+def search_members(gym_id, prefix, limit):
+    """Members of gym_id whose username starts with prefix, case insensitive, as (id, username) ordered by name."""
+    username = func.lower(User.username)
+    member = exists().where((gym_memberships.c.user == User.id) & (gym_memberships.c.gym == gym_id))
+    # Walking ix_users_username_lower in order and checking membership per user stops after `limit` matches,
+    # however big the gym is
+    return db.session.query(User.id, User.username)\
+        .filter(*starts_with(username, prefix), member)\
+        .order_by(username).limit(limit).all()
+
+
+def user_options(search, value):
+    """Dropdown options for the members matching search, the selected users are always included."""
+    value = value or []
+    options = [{"label": x.username, "value": x.id} for x in users_by_id(value)]
+    found = search_members(get_chosen_gym().id, search, config.USER_SEARCH_LIMIT) if search else []
+    return options + [{"label": name, "value": _id} for _id, name in found if _id not in value]
+
+
+@app.callback(
+    Output("gym_admins", "options"),
+    [Input("gym_admins", "search_value")],
+    [State("gym_admins", "value")]
+)
+def search_admins(search, value):
+    if not search or not is_admin():
+        raise PreventUpdate
+    return user_options(search, value)
+
+
+@app.callback(
+    Output("gym_instructors", "options"),
+    [Input("gym_instructors", "search_value")],
+    [State("gym_instructors", "value")]
+)
+def search_instructors(search, value):
+    if not search or not is_admin():
+        raise PreventUpdate
+    return user_options(search, value)
 
 
 @app.callback(
@@ -43,10 +94,12 @@ def on_save_gym(book_before, max_days_ahead, max_persons, max_booking_length, ma
             zone.name = name
             zone.max_people = capacity
 
-        get_chosen_gym().admins = [User.query.filter_by(id=x).first() for x in admins]
-        get_chosen_gym().instructors = [User.query.filter_by(id=x).first() for x in instructors]
+        g.admins = users_by_id(admins)
+        g.instructors = users_by_id(instructors)
+        g.settings_version = Gym.settings_version + 1
         db.session.add(g)
         db.session.commit()
+        clear_request_cache()
         return "Success", "success", True
     except Exception as e:
         print(e)
@@ -95,22 +148,18 @@ def on_new_zone():
             g = get_chosen_gym()
 
             g.zones.append(Zone(name="New Zone", max_people=None))
+            g.settings_version = Gym.settings_version + 1
 
             db.session.add(g)
             db.session.commit()
+            clear_request_cache()
 
         except Exception as e:
             print(e)
     else:
         if len(get_chosen_gym().zones) == 1:
             raise PreventUpdate
-        zone_id = trig.id["id"]
-        zone = get_zone(zone_id)
-        for booking in zone.bookings:
-            db.session.delete(booking)
-
-        db.session.delete(zone)
-        db.session.commit()
+        delete_zone(trig.id["id"])
 
     return create_zones_list()
 
@@ -137,7 +186,6 @@ def create_setting(title, _input: dbc.Input, details: str = None):
 def create_gym_admin_layout():
     gym = get_chosen_gym()
 
-    users = gym.users
     admins = gym.admins
     instructors = gym.instructors
 
@@ -195,8 +243,9 @@ def create_gym_admin_layout():
                                 id="gym_admins",
                                 value=[x.id for x in admins],
                                 options=[
-                                    {"label": x.username, "value": x.id} for x in users
+                                    {"label": x.username, "value": x.id} for x in admins
                                 ],
+                                placeholder="Type to search members",
                                 multi=True
                             ),
                             dbc.FormText(
@@ -211,8 +260,9 @@ def create_gym_admin_layout():
                                 id="gym_instructors",
                                 value=[x.id for x in instructors],
                                 options=[
-                                    {"label": x.username, "value": x.id} for x in users
+                                    {"label": x.username, "value": x.id} for x in instructors
                                 ],
+                                placeholder="Type to search members",
                                 multi=True
                             ),
                             dbc.FormText("Instructors are not limited by the current booking restrictions.")
@@ -296,6 +346,46 @@ def create_gym_admin_layout():
     ])
 
 
+def move_bookings(from_zone, to_zone):
+    to_move = Booking.query.filter(Booking.zone_id == from_zone).all()
+
+    for b in to_move:
+        b.zone_id = to_zone
+        db.session.add(b)
+    db.session.commit()
+    occupancy_cache.invalidate(from_zone, to_zone)
+    return len(to_move)
+
+
+def delete_zone(zone_id):
+    zone = get_zone(zone_id)
+    # Neither kind of booking is cascaded by the database, and zone_id can't be set to NULL
+    for booking in zone.bookings + zone.repeating_bookings:
+        db.session.delete(booking)
+
+    db.session.delete(zone)
+    get_chosen_gym().settings_version = Gym.settings_version + 1
+    db.session.commit()
+    occupancy_cache.invalidate(zone_id)
+    clear_request_cache()
+
+
+def prune_bookings(start_date, zones):
+    to_delete = Booking.query.filter(Booking.start >= start_date)
+    if zones:
+        for zone in zones:
+            to_delete = to_delete.filter_by(zone_id=zone)
+
+    to_delete = to_delete.all()
+    zone_ids = {b.zone_id for b in to_delete}
+
+    for b in to_delete:
+        db.session.delete(b)
+    db.session.commit()
+    occupancy_cache.invalidate(*zone_ids)
+    return len(to_delete)
+
+
 @app.callback(
     [Output("move-bookings-modal", "is_open"), Output("moved-msg", "children"), Output("moved-msg", "is_open")],
     [Trigger("move-bookings", "n_clicks"), Trigger("do-move", "n_clicks")],
@@ -309,14 +399,7 @@ def show_modal(from_zone, to_zone):
 
     txt = ""
     if trig.id == "do-move":
-
-        to_move = Booking.query.filter(Booking.zone_id == from_zone).all()
-
-        for b in to_move:
-            b.zone_id = to_zone
-            db.session.add(b)
-        db.session.commit()
-        txt = f"Moved {len(to_move)} bookings"
+        txt = f"Moved {move_bookings(from_zone, to_zone)} bookings"
 
     return trig.id in ["do-move", "move-bookings"], txt, txt != ""
 
@@ -335,18 +418,7 @@ def show_modal(n1, n2, is_open, zones, start_date):
     start_date = as_datetime(start_date)
     txt = ""
     if trig.id == "do-delete":
-
-        to_delete = Booking.query.filter(Booking.start >= start_date)
-        if zones:
-            for zone in zones:
-                to_delete = to_delete.filter_by(zone_id=zone)
-
-        to_delete = to_delete.all()
-
-        for b in to_delete:
-            db.session.delete(b)
-        db.session.commit()
-        txt = f"Deleted {len(to_delete)} bookings"
+        txt = f"Deleted {prune_bookings(start_date, zones)} bookings"
 
     return trig.id in ["do-delete", "prune-bookings"], txt, txt != ""
 
@@ -14,12 +14,15 @@ import numpy as np
 
 import config
 from app import app
-from booking_logic import validate_booking, create_weekly_booking_map
+from booking_logic import validate_booking, create_weekly_booking_map, occupancy_cache, admit_booking
 from components import create_gym_info
+from heatmap_payload import encode_heatmap, MINE, CLOSED
+from layout_cache import LayoutCache
 from models import Booking, db, GymBooking
-from pages.bookings_list import my_bookings_list
+from occupancy_events import latest_change
+from pages.bookings_list import my_bookings_list, REPEAT_DESCRIPTION
 from time_utils import start_of_week, start_of_day, timeslot_index, parse, as_date
-from utils import get_chosen_gym, is_admin, get_zone, is_instructor
+from utils import get_chosen_gym, is_admin, get_zone, is_instructor, get_max_people
 
 BOOTSTRAP_BLUE = "#0275d8"
 BOOTSTRAP_GREEN = "#5cb85c"
@@ -28,6 +31,11 @@ BOOTSTRAP_ORANGE = "#f0ad4e"
 BOOTSTRAP_YELLOW = "#f0e24e"
 BOOTSTRAP_RED = "#d9534f"
 
+layout_cache = LayoutCache(config.LAYOUT_CACHE_SIZE)
+
+# Builds of a heatmap before giving up on reading it between two changes of its zone
+HEATMAP_ATTEMPTS = 3
+
 
 def parse_heatmap_click(data):
     return datetime.strptime(data["points"][0]["x"].split(" ")[0] + " " + data["points"][0]["y"], "%Y-%m-%d %H:%M")
@@ -37,19 +45,65 @@ def get_max_booking_length():
     return get_chosen_gym().max_booking_length if get_chosen_gym().max_booking_length is not None else 24 * 4
 
 
+def can_next_week(zone, d):
+    return (is_admin() or is_instructor()) or \
+           zone.gym.max_days_ahead is None or \
+           datetime.now() + timedelta(days=zone.gym.max_days_ahead) > d + timedelta(days=7)
+
+
+def can_prev_week(d):
+    return datetime.now() < d
+
+
+def heatmap_data(zone_id, d, changes=None):
+    if changes is None:
+        changes = latest_change(zone_id)
+    for _ in range(HEATMAP_ATTEMPTS):
+        week_start_day, occupancy, states = create_heatmap(d, zone_id)
+        # A change committed while the map was built may be in it, and would be counted again when it is pushed
+        latest = latest_change(zone_id)
+        if latest == changes:
+            break
+        changes = latest
+    return encode_heatmap(zone_id, week_start_day, occupancy, states, get_max_people(zone_id), config.CLOSE, changes)
+
+
 @app.callback(
     [Output("data-store", "data")],
-    [Input("selection_store", "data"), Input("view_store", "data"), Trigger("bookings_store", "data")])
-def redraw_all(data, view_data):
-    if len(current_user.gyms) == 0 or view_data["zone"] is None:
+    [Input("heatmap_key", "data"), Trigger("bookings_store", "data"), Trigger("heatmap-refresh", "n_clicks")])
+def redraw_all(key):
+    if len(current_user.gyms) == 0 or key.get("zone") is None:
         raise PreventUpdate
 
-    d = parse(data["d"])
+    zone_id = key["zone"]
+    changes = latest_change(zone_id)
+    # The browser is showing prefetched data, which is still current
+    if changes is not None and key.get("version") == changes:
+        raise PreventUpdate
 
-    zone_id = view_data["zone"]
-    _max = get_chosen_gym().get_max_people(zone_id)
-    x, y, z, hover = create_heatmap(d, parse(data["f"]), parse(data["t"]), zone_id)
-    return {"x": x, "y": y, "z": z, "max": _max, "close": config.CLOSE, "hover": hover}
+    return heatmap_data(zone_id, parse(key["d"]), changes)
+
+
+@app.callback(
+    Output("prefetch_store", "data"),
+    [Input("rendered_key", "data")]
+)
+def prefetch(key):
+    """Maps of the adjacent weeks and the other zones, so set_fig can show them as soon as they are picked."""
+    if not config.PREFETCH or len(current_user.gyms) == 0 or key.get("zone") is None:
+        raise PreventUpdate
+
+    zone = get_zone(key["zone"])
+    d = parse(key["d"])
+
+    keys = []
+    if can_prev_week(d):
+        keys.append((zone.id, d - timedelta(days=7)))
+    if can_next_week(zone, d):
+        keys.append((zone.id, d + timedelta(days=7)))
+    keys += [(x.id, d) for x in get_chosen_gym().zones if x.id != zone.id][:config.PREFETCH_ZONES]
+
+    return {f"{zone_id}|{week.date().isoformat()}": heatmap_data(zone_id, week) for zone_id, week in keys}
 
 
 @app.callback(
@@ -75,11 +129,10 @@ def on_booking(data, nr_bookings, view_data, repeat):
                                repeat=repeat))
                 db.session.commit()
             else:
-                validate_booking(b_start, b_end, nr_bookings, view_data["zone"])
-                booking = Booking(start=b_start, end=b_end, user=current_user,
-                                  zone=get_zone(view_data["zone"]), number=nr_bookings)
-                db.session.add(booking)
-                db.session.commit()
+                admit_booking(b_start, b_end, nr_bookings, view_data["zone"])
+            occupancy_cache.invalidate(view_data["zone"])
+            # Makes heatmap_key change, so the occupancy is reloaded
+            data["booked"] = data.get("booked", 0) + 1
 
             msg = "Success"
             msg_color = "success"
@@ -107,12 +160,7 @@ def update_week(data, view_data):
     d = parse(data["d"])
     zone = get_zone(view_data["zone"])
 
-    can_next_week = (is_admin() or is_instructor()) or \
-                    zone.gym.max_days_ahead is None or \
-                    datetime.now() + timedelta(days=zone.gym.max_days_ahead) > d + timedelta(days=7)
-    can_prev_week = datetime.now() < d
-
-    return d.isocalendar()[1], not can_next_week, not can_prev_week
+    return d.isocalendar()[1], not can_next_week(zone, d), not can_prev_week(d)
 
 
 @app.callback(
@@ -130,12 +178,10 @@ def on_week(data, view_data):
     zone = get_zone(view_data["zone"])
 
     if trig.id == "next_week":
-        if (is_admin() or is_instructor()) or \
-                zone.gym.max_days_ahead is None or \
-                datetime.now() + timedelta(days=zone.gym.max_days_ahead) > d + timedelta(days=7):
+        if can_next_week(zone, d):
             data["d"] = d + timedelta(days=7)
     if trig.id == "prev_week":
-        if datetime.now() < d:
+        if can_prev_week(d):
             data["d"] = d - timedelta(days=7)
 
     return data
@@ -152,44 +198,27 @@ def toggle_popover(n, is_open):
     return is_open
 
 
-def create_heatmap(d, f, t, zone_id):
+def create_heatmap(d, zone_id):
     days = 7
     zone = get_zone(zone_id)
     week_start_day = start_of_week(d)
     week_end_day = week_start_day + timedelta(days=days)
 
     all_bookings, my_bookings = create_weekly_booking_map(d, zone_id, days)
-    hover = all_bookings.copy()
-
-    x = [(week_start_day.date() + timedelta(days=x)) for x in range(days)]
-    start = datetime(1, 1, 1)
-    y = list(reversed([(start + timedelta(minutes=15 * k)).strftime("%H:%M") for k in range(24 * 4)]))
-
-    all_bookings[my_bookings > 0] = -3
+    states = np.zeros(len(all_bookings), dtype=np.uint8)
 
-    if f and week_start_day <= f < week_end_day:
-
-        start_idx = timeslot_index(f, week_start_day)
-
-        all_bookings[start_idx] = -3.5
-        if t:
-            end_idx = timeslot_index(t, week_start_day)
-            for _x in range(start_idx + 1, end_idx):
-                all_bookings[_x] = -3.5
+    states[my_bookings > 0] = MINE
 
     if week_start_day < datetime.now():
-        all_bookings[:timeslot_index(datetime.now(), week_start_day)] = -4.5
+        states[:timeslot_index(datetime.now(), week_start_day)] = CLOSED
 
     if not (is_admin() or is_instructor()) and zone.gym.max_days_ahead is not None and \
             start_of_day(datetime.now()) + timedelta(days=zone.gym.max_days_ahead) < week_end_day:
         latest = timeslot_index(start_of_day(datetime.now()) + timedelta(days=zone.gym.max_days_ahead + 1),
                                 week_start_day)
-        all_bookings[max(latest, 0):] = -4.5
-
-    z = np.flipud(np.reshape(all_bookings, (days, 24 * 4)).transpose())
-    hover = np.flipud(np.reshape(hover, (days, 24 * 4)).transpose())
+        states[max(latest, 0):] = CLOSED
 
-    return x, y, z, hover
+    return week_start_day, all_bookings, states
 
 
 OPTIONS = [{'label': (datetime(1, 1, 1) + timedelta(minutes=15 * x)).strftime("%H:%M"), 'value': x} for x in
@@ -329,21 +358,15 @@ def update_zone(data):
     return zone.gym.zones[0].id == zone.id, zone.gym.zones[-1].id == zone.id, name
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(
+        namespace='clientside',
+        function_name='update_zone_picker'
+    ),
     Output("zone-picker", "value"),
-    [Trigger("next-zone", "n_clicks"), Trigger("prev-zone", "n_clicks")],
+    [Input("next-zone", "n_clicks"), Input("prev-zone", "n_clicks")],
     [State("zone-picker", "options"), State("zone-picker", "value")]
 )
-def update_zone_picker(zone_picker_options, zone_picker_value):
-    values = [x["value"] for x in zone_picker_options]
-    idx = values.index(zone_picker_value)
-    trig = get_triggered()
-
-    if trig.id == "next-zone" and idx < len(values) - 1:
-        return values[idx+1]
-    elif trig.id == "prev-zone" and idx > 0:
-        return values[idx-1]
-    raise PreventUpdate
 
 
 @app.callback(
@@ -391,14 +414,24 @@ app.clientside_callback(
     [Input("date-picker", "date")]
 )
 
+app.clientside_callback(
+    ClientsideFunction(
+        namespace='clientside',
+        function_name='heatmap_key'
+    ),
+    [Output("heatmap_key", "data")],
+    [Input("selection_store", "data"), Input("view_store", "data")],
+    [State("heatmap_key", "data"), State("prefetch_store", "data")]
+)
+
 app.clientside_callback(
     ClientsideFunction(
         namespace='clientside',
         function_name='set_fig'
     ),
-    [Output("main-graph", "figure")],
-    [Input("data-store", "data")],
-    [State("view_store", "data")]
+    [Output("main-graph", "figure"), Output("rendered_key", "data")],
+    [Input("data-store", "data"), Input("selection_store", "data"), Input("view_store", "data")],
+    [State("prefetch_store", "data")]
 )
 
 
@@ -429,19 +462,17 @@ def nr_bookings_options(view_data):
     return [{"value": x, "label": x} for x in range(1, max_nr + 1)]
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(
+        namespace='clientside',
+        function_name='toggle_spinner'
+    ),
     [Output("progress-spinner", "hidden")],
-    [Trigger("prev_week", "n_clicks"), Trigger("next_week", "n_clicks"),
-     Trigger("prev-zone", "n_clicks"), Trigger("next-zone", "n_clicks"),
-     Trigger("show-text", "n_clicks"), Trigger("show-text-2", "n_clicks"), Trigger("main-graph", "figure")],
+    [Input("prev_week", "n_clicks"), Input("next_week", "n_clicks"),
+     Input("prev-zone", "n_clicks"), Input("next-zone", "n_clicks"),
+     Input("show-text", "n_clicks"), Input("show-text-2", "n_clicks"), Input("main-graph", "figure")],
     [State("view_store", "data")]
 )
-def do(view_data):
-    trig = get_triggered()
-    if trig.id == "main-graph" and view_data["zone"] is not None:
-        return True
-    else:
-        return False
 
 
 def create_zone_picker(id, gym):
@@ -477,6 +508,12 @@ def toggle_popover(n, is_open):
 
 
 def create_main_layout(gym):
+    privileged = is_admin() or is_instructor()
+    today = date.today()
+    booking_card, bookings_card, heatmap_col = layout_cache.get(
+        (gym.id, gym.settings_version, privileged, today),
+        lambda: create_static_main_layout(gym, privileged, today)
+    )
     return dbc.Row([
         html.Div(id="dummy2", hidden=True),
         html.Div(id="dummy", hidden=True),
@@ -484,228 +521,238 @@ def create_main_layout(gym):
             dbc.Row([
                 dbc.Col([
                     html.H4(f"Welcome {current_user.username}", className="my-3"),
-                    dbc.Card([
-                        dbc.CardHeader(html.Span([
-                            "New booking",
-                            dbc.Button(html.I(className="fa fa-question"), id="popover-help-target",
-                                       className="float-right", color="white", size="sm"),
-                            dbc.Popover(
-                                [
-                                    dbc.PopoverHeader("Current booking rules"),
-                                    dbc.PopoverBody(create_gym_info(gym)),
-                                ],
-                                id="popover-help",
-                                is_open=False,
-                                target="popover-help-target",
-                                placement="bottom-left"
-                            ),
-                        ], style={"width": "100%"})),
-                        dbc.CardBody([
-                            create_zone_picker("zone-picker", gym),
-                            html.Div([
-                                dbc.Row([
-                                    dbc.Col([
-                                        html.Span(html.I(className="fa fa-user-friends"))
-                                    ], width=3, style={"margin": "auto"}),
-                                    dbc.Col([
-                                        dcc.Dropdown(
-                                            id="nr_bookings",
-                                            value=1,
-                                            options=[{"value": 1, "label": 1}],
-                                            clearable=False
-                                        )
-                                    ], width=9)
-                                ], justify="between", className="my-1"),
-                            ], hidden=gym.max_number_per_booking == 1 and not (is_admin() or is_instructor())),
-                            dbc.Row([
-                                dbc.Col([
-                                    html.Span("Day")
-                                ], width=3, style={"margin": "auto"}),
-                                dbc.Col([
-                                    html.Div([
-                                        dcc.DatePickerSingle(
-                                            id="date-picker",
-                                            date=datetime.now().date(),
-                                            min_date_allowed=datetime.now().date(),
-                                            max_date_allowed=datetime.now().date() + timedelta(
-                                                days=gym.max_days_ahead) if not (
-                                                        is_admin() or is_instructor()) and gym.max_days_ahead else None,
-                                            display_format="DD-MM-YYYY",
-                                            clearable=False,
-                                            first_day_of_week=1
-                                        )
-                                    ])
-                                ], width=9)
-                            ], justify="between", className="my-1"),
-                            dbc.Row([
-                                dbc.Col([
-                                    html.Span("Time")
-                                ], width=3, style={"margin": "auto"}),
-                                dbc.Col([
-                                    dbc.Row([
-                                        dbc.Col([
-                                            dcc.Dropdown(
-                                                id="from-drop-down",
-                                                # value=4 * 8,
-                                                options=OPTIONS[:-1],
-                                                searchable=False,
-                                            )
-                                        ], width=12, sm=5),
-                                        dbc.Col([
-                                            html.Div("-", style={"text-align": "center", "margin": "auto"})
-                                        ], width=0, sm=2),
-                                        dbc.Col([
-                                            dcc.Dropdown(
-                                                id="to-drop-down",
-                                                options=OPTIONS[:-1],
-                                                searchable=False,
-                                            )
-                                        ], width=12, sm=5)
-                                    ])
-                                ], width=9)
-                            ], justify="between", className="my-1"),
-                            html.Div([
-                                html.Hr(),
-                                dbc.Row([
-                                    dbc.Col([
-                                        html.Span("Repeat")
-                                    ], width=3, style={"margin": "auto"}),
-                                    dbc.Col([
-                                        dcc.Dropdown(
-                                            id="repeat-drop-down",
-                                            value=None,
-                                            options=[
-                                                dict(label="Weekly", value="w")
-                                            ],
-                                            searchable=False,
-                                        )
-                                    ], width=9)
-                                ]),
-                                dbc.FormText(
-                                    "Admins can schedule weekly repeated bookings by selecting Weekly in the dropdown. If nothing is selected, bookings are made for the user as usual. Notice they are shown in the admin-panel and NOT here.")
-                            ], hidden=(not (is_instructor() or is_admin()))),
-                            dbc.Alert(id="msg", is_open=False, duration=5000, className="mt-3"),
-                            dbc.Alert("Empty", id="msg2", is_open=False, className="mt-3 mb-0"),
-                        ]),
-                        dbc.CardFooter([
-                            dbc.Row([dbc.Button("Book", id="book", color="primary")], justify="end")
-                        ])
-                    ])
+                    booking_card
                 ], width=12)
             ]),
-            dbc.Card([
-                dbc.CardHeader("My bookings"),
-                dbc.CardBody([
-                    dbc.Row([
-                        dbc.Col([
-                            my_bookings_list
-                        ])
-                    ])
-                ])
-            ], className="my-3")
+            bookings_card
         ], width=12, lg=3),
-        dbc.Col([
-            dbc.Container([
-                html.Div([dbc.Row([
+        heatmap_col,
+    ], className="p-3")
+
+
+def create_static_main_layout(gym, privileged, today):
+    """The parts of the main page which only depend on the gym settings, the role and the day."""
+    booking_card = dbc.Card([
+        dbc.CardHeader(html.Span([
+            "New booking",
+            dbc.Button(html.I(className="fa fa-question"), id="popover-help-target",
+                       className="float-right", color="white", size="sm"),
+            dbc.Popover(
+                [
+                    dbc.PopoverHeader("Current booking rules"),
+                    dbc.PopoverBody(create_gym_info(gym)),
+                ],
+                id="popover-help",
+                is_open=False,
+                target="popover-help-target",
+                placement="bottom-left"
+            ),
+        ], style={"width": "100%"})),
+        dbc.CardBody([
+            create_zone_picker("zone-picker", gym),
+            html.Div([
+                dbc.Row([
                     dbc.Col([
-                        dbc.Row([
-                            dbc.Badge("Free slots", color="white", className="mx-1 mb-1"),
-                            dbc.Badge(f"Booked", color="success", className="mx-1 mb-1"),
-                        ]),
-                        dbc.Row([
-                            dbc.Badge("Full", color="danger", className="mx-1 mb-1"),
-                            dbc.Badge(f"1", color="warning", className="mx-1 mb-1"),
-                            dbc.Badge(f"2-3", className="mx-1 mb-1",
-                                      style={"background-color": BOOTSTRAP_YELLOW, "color": "black"}),
-                            dbc.Badge(f"4+", color="primary", className="mx-1 mb-1"),
-                        ])
-                    ], width=7),
+                        html.Span(html.I(className="fa fa-user-friends"))
+                    ], width=3, style={"margin": "auto"}),
                     dbc.Col([
-                        dbc.Row([
-                            dbc.Button(html.I(className="fa fa-users"), id="show-text-2",
-                                       className="mx-1", color="primary"),
-                            dbc.DropdownMenu([
-                                dbc.DropdownMenuItem("AM", id="show-am-2"),
-                                dbc.DropdownMenuItem("PM", id="show-pm-2"),
-                                dbc.DropdownMenuItem("8-16", id="show-8-16-2"),
-                                dbc.DropdownMenuItem("15-23", id="show-15-23-2")
-                            ], label="\u231A", color="primary")
-                        ], justify="end")
-                    ], width=5, style={"text-align": "right"})
-                ], justify="between", className="my-3")], className=" d-block d-md-none"),
-
+                        dcc.Dropdown(
+                            id="nr_bookings",
+                            value=1,
+                            options=[{"value": 1, "label": 1}],
+                            clearable=False
+                        )
+                    ], width=9)
+                ], justify="between", className="my-1"),
+            ], hidden=gym.max_number_per_booking == 1 and not privileged),
+            dbc.Row([
+                dbc.Col([
+                    html.Span("Day")
+                ], width=3, style={"margin": "auto"}),
+                dbc.Col([
+                    html.Div([
+                        dcc.DatePickerSingle(
+                            id="date-picker",
+                            date=today,
+                            min_date_allowed=today,
+                            max_date_allowed=today + timedelta(days=gym.max_days_ahead)
+                            if not privileged and gym.max_days_ahead else None,
+                            display_format="DD-MM-YYYY",
+                            clearable=False,
+                            first_day_of_week=1
+                        )
+                    ])
+                ], width=9)
+            ], justify="between", className="my-1"),
+            dbc.Row([
+                dbc.Col([
+                    html.Span("Time")
+                ], width=3, style={"margin": "auto"}),
+                dbc.Col([
+                    dbc.Row([
+                        dbc.Col([
+                            dcc.Dropdown(
+                                id="from-drop-down",
+                                # value=4 * 8,
+                                options=OPTIONS[:-1],
+                                searchable=False,
+                            )
+                        ], width=12, sm=5),
+                        dbc.Col([
+                            html.Div("-", style={"text-align": "center", "margin": "auto"})
+                        ], width=0, sm=2),
+                        dbc.Col([
+                            dcc.Dropdown(
+                                id="to-drop-down",
+                                options=OPTIONS[:-1],
+                                searchable=False,
+                            )
+                        ], width=12, sm=5)
+                    ])
+                ], width=9)
+            ], justify="between", className="my-1"),
+            html.Div([
+                html.Hr(),
                 dbc.Row([
                     dbc.Col([
-                        dbc.Row([dbc.Badge("Free slots", color="white", className="mx-1 mb-1")]),
-                        dbc.Row([
-                            dbc.Badge("Full", color="danger", className="mx-1 mb-1"),
-                            dbc.Badge(f"1", color="warning", className="mx-1 mb-1"),
-                            dbc.Badge(f"2-3", className="mx-1 mb-1",
-                                      style={"background-color": BOOTSTRAP_YELLOW, "color": "black"}),
-                            dbc.Badge(f"4+", color="primary", className="mx-1 mb-1"),
-                            dbc.Badge(f"Booked", color="success", className="mx-1 mb-1")
-                        ])
-                    ], style={"margin-top": "auto"}, width=3, className="d-none d-md-block"),
+                        html.Span("Repeat")
+                    ], width=3, style={"margin": "auto"}),
                     dbc.Col([
-                        html.Div([
-                            dbc.Button(html.I(className="fa fa-arrow-left"), id="prev_week", color="primary",
-                                       disabled=True, size="sm"),
+                        dcc.Dropdown(
+                            id="repeat-drop-down",
+                            value=None,
+                            options=[
+                                dict(label=label, value=value) for value, label in REPEAT_DESCRIPTION.items()
+                            ],
+                            searchable=False,
+                        )
+                    ], width=9)
+                ]),
+                dbc.FormText(
+                    "Admins can schedule repeated bookings by selecting how often they repeat in the dropdown. If nothing is selected, bookings are made for the user as usual. Notice they are shown in the admin-panel and NOT here.")
+            ], hidden=not privileged),
+            dbc.Alert(id="msg", is_open=False, duration=5000, className="mt-3"),
+            dbc.Alert("Empty", id="msg2", is_open=False, className="mt-3 mb-0"),
+        ]),
+        dbc.CardFooter([
+            dbc.Row([dbc.Button("Book", id="book", color="primary")], justify="end")
+        ])
+    ])
+
+    bookings_card = dbc.Card([
+        dbc.CardHeader("My bookings"),
+        dbc.CardBody([
+            dbc.Row([
+                dbc.Col([
+                    my_bookings_list
+                ])
+            ])
+        ])
+    ], className="my-3")
+
+    heatmap_col = dbc.Col([
+        dbc.Container([
+            html.Div([dbc.Row([
+                dbc.Col([
+                    dbc.Row([
+                        dbc.Badge("Free slots", color="white", className="mx-1 mb-1"),
+                        dbc.Badge(f"Booked", color="success", className="mx-1 mb-1"),
+                    ]),
+                    dbc.Row([
+                        dbc.Badge("Full", color="danger", className="mx-1 mb-1"),
+                        dbc.Badge(f"1", color="warning", className="mx-1 mb-1"),
+                        dbc.Badge(f"2-3", className="mx-1 mb-1",
+                                  style={"background-color": BOOTSTRAP_YELLOW, "color": "black"}),
+                        dbc.Badge(f"4+", color="primary", className="mx-1 mb-1"),
+                    ])
+                ], width=7),
+                dbc.Col([
+                    dbc.Row([
+                        dbc.Button(html.I(className="fa fa-users"), id="show-text-2",
+                                   className="mx-1", color="primary"),
+                        dbc.DropdownMenu([
+                            dbc.DropdownMenuItem("AM", id="show-am-2"),
+                            dbc.DropdownMenuItem("PM", id="show-pm-2"),
+                            dbc.DropdownMenuItem("8-16", id="show-8-16-2"),
+                            dbc.DropdownMenuItem("15-23", id="show-15-23-2")
+                        ], label="\u231A", color="primary")
+                    ], justify="end")
+                ], width=5, style={"text-align": "right"})
+            ], justify="between", className="my-3")], className=" d-block d-md-none"),
+
+            dbc.Row([
+                dbc.Col([
+                    dbc.Row([dbc.Badge("Free slots", color="white", className="mx-1 mb-1")]),
+                    dbc.Row([
+                        dbc.Badge("Full", color="danger", className="mx-1 mb-1"),
+                        dbc.Badge(f"1", color="warning", className="mx-1 mb-1"),
+                        dbc.Badge(f"2-3", className="mx-1 mb-1",
+                                  style={"background-color": BOOTSTRAP_YELLOW, "color": "black"}),
+                        dbc.Badge(f"4+", color="primary", className="mx-1 mb-1"),
+                        dbc.Badge(f"Booked", color="success", className="mx-1 mb-1")
+                    ])
+                ], style={"margin-top": "auto"}, width=3, className="d-none d-md-block"),
+                dbc.Col([
+                    html.Div([
+                        dbc.Button(html.I(className="fa fa-arrow-left"), id="prev_week", color="primary",
+                                   disabled=True, size="sm"),
+                        html.Span([
                             html.Span([
-                                html.Span([
-                                    html.Span("Week", className="ml-3 mr-1"),
-                                    html.Span(datetime.now().isocalendar()[1], id="week", className="mr-3 ml-1"),
+                                html.Span("Week", className="ml-3 mr-1"),
+                                html.Span(today.isocalendar()[1], id="week", className="mr-3 ml-1"),
 
-                                ], id="week-text", style={"position": "relative"}),
+                            ], id="week-text", style={"position": "relative"}),
 
-                            ], style={"width": "100%"}),
-                            dbc.Button(html.I(className="fa fa-arrow-right"), id="next_week", color="primary",
-                                       size="sm")
-                        ], style={"text-align": "center"})
-                    ], width=12, md=6),
-                    dbc.Col([
-                        dbc.Row([
-                            dbc.Button(html.I(className="fa fa-users"), id="show-text",
-                                       className="mx-1", color="primary"),
-                            dbc.DropdownMenu([
-                                # dbc.DropdownMenuItem("24h", id="show-all"),
-                                dbc.DropdownMenuItem("AM", id="show-am"),
-                                dbc.DropdownMenuItem("PM", id="show-pm"),
-                                dbc.DropdownMenuItem("8-16", id="show-8-16"),
-                                dbc.DropdownMenuItem("15-23", id="show-15-23")
-                            ], label="\u231A", color="primary")
-                        ], justify="end")
-                    ], width=3, style={"text-align": "right"}, className="d-none d-md-block")
-                ], justify="between", className="my-3"),
-                html.Div([
+                        ], style={"width": "100%"}),
+                        dbc.Button(html.I(className="fa fa-arrow-right"), id="next_week", color="primary",
+                                   size="sm")
+                    ], style={"text-align": "center"})
+                ], width=12, md=6),
+                dbc.Col([
                     dbc.Row([
-                        dbc.Col([
-                            html.Div([
-                                dbc.Button(html.I(className="fa fa-arrow-left"), id="prev-zone", color="primary",
-                                           size="sm"),
-                                html.Span([
-                                    html.Span(id="mobile-zone", className="mx-3"),
-                                ]),
-                                dbc.Button(html.I(className="fa fa-arrow-right"), id="next-zone", color="primary",
-                                           size="sm")
-                            ], style={"text-align": "center"})
-                        ], width=12)
-                    ], justify="around", className="d-block d-md-none")
-                ], hidden=len(gym.zones) < 2),
+                        dbc.Button(html.I(className="fa fa-users"), id="show-text",
+                                   className="mx-1", color="primary"),
+                        dbc.DropdownMenu([
+                            # dbc.DropdownMenuItem("24h", id="show-all"),
+                            dbc.DropdownMenuItem("AM", id="show-am"),
+                            dbc.DropdownMenuItem("PM", id="show-pm"),
+                            dbc.DropdownMenuItem("8-16", id="show-8-16"),
+                            dbc.DropdownMenuItem("15-23", id="show-15-23")
+                        ], label="\u231A", color="primary")
+                    ], justify="end")
+                ], width=3, style={"text-align": "right"}, className="d-none d-md-block")
+            ], justify="between", className="my-3"),
+            html.Div([
                 dbc.Row([
                     dbc.Col([
                         html.Div([
-                            dcc.Graph(
-                                id="main-graph",
-                                style={"height": "70vh", "width": "100%"}),
+                            dbc.Button(html.I(className="fa fa-arrow-left"), id="prev-zone", color="primary",
+                                       size="sm"),
                             html.Span([
-                                dbc.Spinner(color="primary", size="lg")
-                            ], id="progress-spinner",
-                                style={"position": "absolute",
-                                       "width": "100%",
-                                       "left": "0", "top": "0"})
-                        ], style={"position": "relative"}),
-                    ], className="px-0", width=12),
-                ], justify="between", className="px-0"),
-            ], fluid=True, className="px-0")
-        ], width=12, lg=7),
-    ], className="p-3")
+                                html.Span(id="mobile-zone", className="mx-3"),
+                            ]),
+                            dbc.Button(html.I(className="fa fa-arrow-right"), id="next-zone", color="primary",
+                                       size="sm")
+                        ], style={"text-align": "center"})
+                    ], width=12)
+                ], justify="around", className="d-block d-md-none")
+            ], hidden=len(gym.zones) < 2),
+            dbc.Row([
+                dbc.Col([
+                    html.Div([
+                        dcc.Graph(
+                            id="main-graph",
+                            style={"height": "70vh", "width": "100%"}),
+                        html.Span([
+                            dbc.Spinner(color="primary", size="lg")
+                        ], id="progress-spinner",
+                            style={"position": "absolute",
+                                   "width": "100%",
+                                   "left": "0", "top": "0"})
+                    ], style={"position": "relative"}),
+                ], className="px-0", width=12),
+            ], justify="between", className="px-0"),
+        ], fluid=True, className="px-0")
+    ], width=12, lg=7)
+
+    return booking_card, bookings_card, heatmap_col
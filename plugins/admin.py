@@ -2,7 +2,7 @@ from flask_admin.contrib.sqla import ModelView
 from flask import redirect, url_for, request
 from flask_login import current_user
 
-from models import User, db, Booking, Gym, Zone
+from models import User, db, Booking, Gym, Zone, BookingArchive
 from flask_admin import Admin
 
 
@@ -20,5 +20,6 @@ def init_flask_admin(fapp):
     admin = Admin(fapp, name='Booking', template_mode='bootstrap3')
     admin.add_view(LoggedinModelView(User, db.session))
     admin.add_view(LoggedinModelView(Booking, db.session))
+    admin.add_view(LoggedinModelView(BookingArchive, db.session))
     admin.add_view(LoggedinModelView(Gym, db.session))
     admin.add_view(LoggedinModelView(Zone, db.session))
@@ -0,0 +1,94 @@
+import sys
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+
+from models import db, Booking
+
+bookings_cli = AppGroup('bookings', help="Maintenance commands for bookings.")
+
+
+def hot_queries():
+    from booking_logic import zone_bookings, zone_repeating_bookings, user_zone_bookings, \
+        user_overlapping_bookings, user_active_bookings, user_daily_bookings
+
+    now = datetime.now()
+    return {
+        "zone bookings": zone_bookings(0, now, now + timedelta(days=7)),
+        "zone repeating bookings": zone_repeating_bookings(0, now, now + timedelta(days=7)),
+        "user zone bookings": user_zone_bookings(0, 0, now, now + timedelta(days=7)),
+        "user bookings": Booking.query.filter(Booking.user_id == 0),
+        "user overlapping bookings": user_overlapping_bookings(0, now, now + timedelta(hours=1)),
+        "user active bookings": user_active_bookings(0, now),
+        "user daily bookings": user_daily_bookings(0, now),
+    }
+
+
+def query_plan(query):
+    connection = db.session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    if compiled.positiontup is not None:
+        params = tuple(compiled.params[k] for k in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    if connection.dialect.name == "sqlite":
+        return [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params)]
+
+    # On an almost empty database PostgreSQL prefers sequential scans, so only ask whether an index can be used
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = [row[0].strip() for row in connection.exec_driver_sql("EXPLAIN " + str(compiled), params)]
+    db.session.rollback()
+    return [x.replace("Seq Scan", "SCAN") for x in plan if "Scan" in x]
+
+
+@bookings_cli.command('check-indexes')
+def check_indexes():
+    """Fail if any of the hot booking queries falls back to a table scan."""
+    failed = False
+    for name, query in hot_queries().items():
+        plan = query_plan(query)
+        scans = [x for x in plan if x.startswith("SCAN")]
+        failed = failed or len(scans) > 0
+        click.echo(f"{'SCAN' if scans else 'OK':<5} {name}: {'; '.join(plan)}")
+
+    if failed:
+        sys.exit(1)
+
+
+@bookings_cli.command('rebuild-occupancy')
+def rebuild_occupancy():
+    """Recompute the zone_slot_occupancy table from the raw bookings."""
+    from slot_occupancy import rebuild
+
+    click.echo(f"Wrote {rebuild()} occupancy rows")
+
+
+@bookings_cli.command('check-occupancy')
+def check_occupancy():
+    """Fail if the zone_slot_occupancy table disagrees with the raw bookings."""
+    from slot_occupancy import check
+
+    mismatches = check()
+    for zone_id, day, slot, table, raw in mismatches[:50]:
+        click.echo(f"zone {zone_id} {day} slot {slot}: table {table}, bookings {raw}")
+
+    if mismatches:
+        click.echo(f"{len(mismatches)} mismatching slots")
+        sys.exit(1)
+    click.echo("OK")
+
+
+@bookings_cli.command('archive')
+@click.option('--days', type=int, default=None, help="Archive bookings which ended this many days ago.")
+@click.option('--chunk-size', type=int, default=None, help="Number of bookings moved per transaction.")
+def archive(days, chunk_size):
+    """Move old bookings into the bookings_archive table."""
+    from archive import archive_bookings
+
+    click.echo(f"Archived {archive_bookings(days, chunk_size)} bookings")
+
+
+def init_commands(fapp):
+    fapp.cli.add_command(bookings_cli)
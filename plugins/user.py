@@ -1,5 +1,6 @@
 from flask_user import UserManager
 from flask_user.forms import RegisterForm
+from sqlalchemy import func
 from wtforms import StringField, ValidationError
 
 from models import User
@@ -11,7 +12,7 @@ class CustomRegisterForm(RegisterForm):
     @staticmethod
     def validate_username(form, field):
         username = field.data
-        if User.query.filter_by(username=username).first():
+        if User.query.filter(func.lower(User.username) == username.lower()).first():
             raise ValidationError('Username already in use')
 
 
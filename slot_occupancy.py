@@ -0,0 +1,168 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db, Booking, ZoneSlotOccupancy
+from occupancy import SLOTS_PER_DAY, SLOT, booking_occupancy
+
+occupancy_table = ZoneSlotOccupancy.__table__
+
+
+def day_ranges(start, end):
+    """Split [start, end) into (day, first slot, end slot) pieces, one per calendar day."""
+    day = datetime(start.year, start.month, start.day)
+    while day < end:
+        next_day = day + timedelta(days=1)
+        first = max(start - day, timedelta(0)) // SLOT
+        last = (min(end, next_day) - day) // SLOT
+        if last > first:
+            yield day.date(), first, last
+        day = next_day
+
+
+def apply_delta(connection, zone_id, start, end, number):
+    """Add `number` persons to every slot of zone_id covered by [start, end)."""
+    t = occupancy_table
+    for day, first, last in day_ranges(start, end):
+        in_range = (t.c.zone_id == zone_id) & (t.c.day == day) & (t.c.slot >= first) & (t.c.slot < last)
+
+        updated = connection.execute(t.update().where(in_range).values(count=t.c.count + number)).rowcount
+
+        if number < 0:
+            connection.execute(t.delete().where(in_range & (t.c.count <= 0)))
+        elif updated < last - first:
+            existing = {x for x, in connection.execute(select(t.c.slot).where(in_range))}
+            connection.execute(t.insert(), [
+                dict(zone_id=zone_id, day=day, slot=slot, count=number)
+                for slot in range(first, last) if slot not in existing
+            ])
+
+
+TRACKED = ["zone_id", "start", "end", "number"]
+
+# Called as f(session, deltas) after every flush, with the (zone_id, start, end, number) deltas it applied
+flush_listeners = []
+
+
+def _old_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[key].value
+
+
+def _is_moved(b):
+    state = inspect(b)
+    return any(state.attrs[k].history.has_changes() for k in TRACKED + ["zone"])
+
+
+def _before_flush(session, flush_context, instances):
+    # Old values have to be read before the flush, while deleted rows still exist
+    removed = []
+    moved = []
+    for b in session.deleted:
+        if isinstance(b, Booking):
+            removed.append((b.zone_id, b.start, b.end, -(b.number or 1)))
+
+    for b in session.dirty:
+        if isinstance(b, Booking) and _is_moved(b):
+            state = inspect(b)
+            zone_id, start, end, number = [_old_value(state, k) for k in TRACKED]
+            removed.append((zone_id, start, end, -(number or 1)))
+            moved.append(b)
+
+    session.info["occupancy_removed"] = removed
+    session.info["occupancy_moved"] = moved
+
+
+def _after_flush(session, flush_context):
+    # New values are read after the flush, when foreign keys set through relationships are populated
+    deltas = session.info.pop("occupancy_removed", [])
+    added = [b for b in session.new if isinstance(b, Booking)] + session.info.pop("occupancy_moved", [])
+    deltas += [(b.zone_id, b.start, b.end, b.number or 1) for b in added]
+
+    if deltas:
+        connection = session.connection()
+        for zone_id, start, end, number in deltas:
+            apply_delta(connection, zone_id, start, end, number)
+
+    for f in flush_listeners:
+        f(session, deltas)
+
+
+def init_slot_occupancy():
+    event.listen(Session, "before_flush", _before_flush)
+    event.listen(Session, "after_flush", _after_flush)
+
+
+def slot_occupancy(zone_id, start, days):
+    """Occupancy of one-off bookings in zone_id for `days` days from `start`, read from the materialized table."""
+    first_day = start.date()
+    rows = db.session.query(ZoneSlotOccupancy.day, ZoneSlotOccupancy.slot, ZoneSlotOccupancy.count)\
+        .filter(ZoneSlotOccupancy.zone_id == zone_id)\
+        .filter(ZoneSlotOccupancy.day >= first_day)\
+        .filter(ZoneSlotOccupancy.day < first_day + timedelta(days=days))\
+        .all()
+
+    result = np.zeros(SLOTS_PER_DAY * days)
+    if rows:
+        result[[(day - first_day).days * SLOTS_PER_DAY + slot for day, slot, _ in rows]] = [x[2] for x in rows]
+    return result
+
+
+def raw_occupancy(zone_id):
+    """Occupancy of zone_id computed from the raw bookings as (first day, per-slot array)."""
+    rows = db.session.query(Booking.start, Booking.end, Booking.number).filter(Booking.zone_id == zone_id).all()
+    if not rows:
+        return None, np.zeros(0)
+
+    first = min(x[0] for x in rows)
+    first = datetime(first.year, first.month, first.day)
+    days = (max(x[1] for x in rows) - first).days + 1
+    return first, booking_occupancy(rows, first, days)
+
+
+def occupied_zone_ids():
+    return {x for x, in db.session.query(Booking.zone_id).distinct()} | \
+           {x for x, in db.session.query(ZoneSlotOccupancy.zone_id).distinct()}
+
+
+def rebuild():
+    """Recompute the whole zone_slot_occupancy table from the raw bookings. Returns the number of rows written."""
+    db.session.execute(occupancy_table.delete())
+    written = 0
+    for zone_id in occupied_zone_ids():
+        first, counts = raw_occupancy(zone_id)
+        rows = [
+            dict(zone_id=zone_id, day=(first + timedelta(days=int(i) // SLOTS_PER_DAY)).date(),
+                 slot=int(i) % SLOTS_PER_DAY, count=int(counts[i]))
+            for i in np.flatnonzero(counts)
+        ]
+        if rows:
+            db.session.execute(occupancy_table.insert(), rows)
+        written += len(rows)
+    db.session.commit()
+    return written
+
+
+def check():
+    """Compare zone_slot_occupancy with the raw bookings. Returns a list of (zone_id, day, slot, table, raw)."""
+    mismatches = []
+    for zone_id in occupied_zone_ids():
+        raw = defaultdict(int)
+        first, counts = raw_occupancy(zone_id)
+        for i in np.flatnonzero(counts):
+            raw[((first + timedelta(days=int(i) // SLOTS_PER_DAY)).date(), int(i) % SLOTS_PER_DAY)] = int(counts[i])
+
+        table = defaultdict(int)
+        for day, slot, count in db.session.query(ZoneSlotOccupancy.day, ZoneSlotOccupancy.slot, ZoneSlotOccupancy.count)\
+                .filter(ZoneSlotOccupancy.zone_id == zone_id):
+            table[(day, slot)] = count
+
+        for key in sorted(set(raw) | set(table)):
+            if raw[key] != table[key]:
+                mismatches.append((zone_id, key[0], key[1], table[key], raw[key]))
+    return mismatches
@@ -0,0 +1,36 @@
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config
+
+
+def profile_pragmas():
+    return [
+        f"journal_mode={config.SQLITE_JOURNAL_MODE}",
+        f"synchronous={config.SQLITE_SYNCHRONOUS}",
+        f"busy_timeout={config.SQLITE_BUSY_TIMEOUT}",
+        f"mmap_size={config.SQLITE_MMAP_SIZE}",
+        f"cache_size={config.SQLITE_CACHE_SIZE}",
+    ]
+
+
+def apply_profile(dbapi_connection, connection_record=None):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma in profile_pragmas():
+        cursor.execute("PRAGMA " + pragma)
+    cursor.close()
+
+
+def current_pragmas(connection):
+    names = ["journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size"]
+    return {x: connection.exec_driver_sql("PRAGMA " + x).scalar() for x in names}
+
+
+def init_sqlite_profile():
+    """Apply the SQLite performance pragmas to every new connection, see the SQLITE_* settings in config."""
+    if config.SQLITE_PROFILE:
+        event.listen(Engine, "connect", apply_profile)
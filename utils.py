@@ -1,28 +1,78 @@
+from flask import g
 from flask_login import current_user
+from sqlalchemy import exists
 
-from models import Zone
+from models import db, Zone, gym_admins, gym_instructors, gym_memberships
+
+
+def request_cached(key, f):
+    """Evaluate f once per request and keep the result on flask.g."""
+    context = g.setdefault("booking_context", {})
+    if key not in context:
+        context[key] = f()
+    return context[key]
+
+
+def clear_request_cache():
+    g.pop("booking_context", None)
+
+
+def has_gym_role(table, user_id, gym_id):
+    """Whether user_id is in gym_id's gym_admins, gym_instructors or gym_memberships, without loading the lists."""
+    return db.session.query(exists().where((table.c.user == user_id) & (table.c.gym == gym_id))).scalar()
+
+
+def is_member(user_id, gym_id):
+    return has_gym_role(gym_memberships, user_id, gym_id)
+
+
+def starts_with(expression, prefix):
+    """
+    Filters for a lowercase expression starting with prefix.
+
+    A range is served by an index on the expression on every database, a LIKE is not on SQLite.
+    """
+    prefix = prefix.lower()
+    return [expression >= prefix, expression < prefix + chr(0x10ffff)]
 
 
 def is_admin():
-    return current_user in get_chosen_gym().admins or current_user.role == "ADMIN"
+    return request_cached("is_admin", lambda: current_user.role == "ADMIN" or
+                          has_gym_role(gym_admins, current_user.id, get_chosen_gym().id))
 
 
 def is_instructor():
-    return current_user in get_chosen_gym().instructors
+    return request_cached("is_instructor", lambda: has_gym_role(gym_instructors, current_user.id, get_chosen_gym().id))
+
+
+def get_zones():
+    return request_cached("zones", lambda: {x.id: x for x in get_chosen_gym().zones})
 
 
 def zone_exists(_id):
-    result = Zone.query.filter_by(id=_id).first()
-    return result is not None
+    return _id in get_zones() or _find_zone(_id) is not None
+
+
+def _find_zone(_id):
+    return request_cached(("zone", _id), lambda: Zone.query.filter_by(id=_id).first())
 
 
 def get_zone(_id):
-    result = Zone.query.filter_by(id=_id).first()
+    result = get_zones().get(_id)
+    if result is None:
+        result = _find_zone(_id)
     if result is None:
         return get_chosen_gym().zones[0]
     else:
         return result
 
 
+def get_max_people(zone_id):
+    zone = get_zones().get(zone_id)
+    if zone is None or zone.max_people is None:
+        return get_chosen_gym().max_people
+    return zone.max_people
+
+
 def get_chosen_gym():
-    return current_user.gyms[0]
+    return request_cached("gym", lambda: current_user.gyms[0])